@@ -0,0 +1,9 @@
+"""Allow `python -m benchmarks` to run the benchmark suite."""
+
+import sys
+
+from benchmarks.runner import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
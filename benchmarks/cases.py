@@ -0,0 +1,99 @@
+"""Synthetic inputs and the benchmark cases run by the suite."""
+
+import os
+
+from tester.processor import TextProcessor
+from tester.template import parse_template
+from tester.wildcard_manager import WildcardManager
+
+
+TEMPLATE_SIZES = (10, 100, 1000)
+NESTING_DEPTHS = (1, 4, 16)
+SAMPLER_MODES = ('random', 'cyclical', 'combinatorial')
+WILDCARD_FILE_COUNTS = (10, 100, 1000, 10000)
+QUICK_FILE_COUNTS = (10, 100, 1000)
+OPTION_COUNT = 5
+LINES_PER_FILE = 20
+
+
+#endregion
+##################################################
+#region Inputs
+def flat_template(size):
+    """`size` variants of OPTION_COUNT options, with literal text between them."""
+    variants = []
+    for index in range(size):
+        options = '|'.join(f"option{index}_{option}" for option in range(OPTION_COUNT))
+        variants.append(f"word{index} {{{options}}}")
+    return ', '.join(variants)
+
+
+def nested_template(depth):
+    """A variant nested `depth` levels deep, with two plain options at every level."""
+    text = "leaf"
+    for level in range(depth):
+        text = f"{{level{level}a|level{level}b|{text}}}"
+    return f"a {text} z"
+
+
+def wildcard_template(wildcard_count):
+    return ' '.join(f"__wildcard{index}__" for index in range(wildcard_count))
+
+
+def write_wildcards(directory, file_count, lines_per_file=LINES_PER_FILE):
+    """Write `file_count` wildcard files, with a comment, a weighted line and a dynamic line in each."""
+    for index in range(file_count):
+        lines = [f"# wildcard {index}"]
+        lines += [f"value{index}_{line}" for line in range(lines_per_file - 2)]
+        lines.append(f"2::weighted{index}")
+        lines.append(f"{{dynamic{index}|line{index}}}")
+        with open(os.path.join(directory, f"wildcard{index}.txt"), 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+def create_processor(wildcards_path=None):
+    wildcard_manager = WildcardManager(remember_path=False)
+    if wildcards_path:
+        wildcard_manager.set_wildcards_path(wildcards_path)
+    return TextProcessor(wildcard_manager, seed=0)
+
+
+#endregion
+##################################################
+#region Cases
+def process_cases(wildcards_path):
+    """Yield (name, function) pairs for the TextProcessor benchmarks."""
+    for size in TEMPLATE_SIZES:
+        text = flat_template(size)
+        yield f"parse/size-{size}", lambda text=text: parse_template(text)
+        processor = create_processor()
+        yield f"process/size-{size}", lambda processor=processor, text=text: processor.process(text)
+    for depth in NESTING_DEPTHS:
+        text = nested_template(depth)
+        processor = create_processor()
+        yield f"process/depth-{depth}", lambda processor=processor, text=text: processor.process(text)
+    text = flat_template(TEMPLATE_SIZES[1])
+    for mode in SAMPLER_MODES:
+        processor = create_processor()
+        processor.set_default_sampler(mode)
+        yield f"sampler/{mode}", lambda processor=processor, text=text: processor.process(text)
+    processor = create_processor(wildcards_path)
+    wildcard_text = wildcard_template(10)
+    yield "process/wildcards-10", lambda: processor.process(wildcard_text)
+    yield "batch/size-100x100", lambda: list(processor.process_batch(text, 100, seed=0))
+    yield "count/size-100", lambda: processor.count_expansions(text)
+
+
+def load_all_wildcards(wildcard_manager):
+    wildcard_manager.load_wildcard_files()
+    for wildcard_name in wildcard_manager.wildcard_files:
+        wildcard_manager.load_wildcard(wildcard_name)
+
+
+def load_cases(directories):
+    """Yield (name, function) pairs: `scan` only indexes file names, `load` also reads every file."""
+    for file_count, directory in directories:
+        wildcard_manager = WildcardManager(remember_path=False)
+        wildcard_manager.wildcards_path = directory
+        yield f"scan/files-{file_count}", wildcard_manager.load_wildcard_files
+        yield f"load/files-{file_count}", lambda wildcard_manager=wildcard_manager: load_all_wildcards(wildcard_manager)
@@ -0,0 +1,134 @@
+"""Runs the benchmark suite and compares the results against a saved baseline."""
+
+# Standard Library
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+# Local Imports
+from benchmarks.cases import QUICK_FILE_COUNTS, WILDCARD_FILE_COUNTS, load_cases, process_cases, write_wildcards
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.2
+REPEAT = 5
+QUICK_REPEAT = 3
+MIN_SAMPLE_TIME = 0.05
+
+
+#endregion
+##################################################
+#region Measure
+def measure(function, repeat=REPEAT):
+    """Return seconds per call of `function`: the best and median of `repeat` samples of at least MIN_SAMPLE_TIME."""
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < MIN_SAMPLE_TIME and number < 1_000_000:
+        number *= 10
+    samples = [seconds / number for seconds in timer.repeat(repeat, number)]
+    return {"seconds": min(samples), "median": statistics.median(samples), "number": number, "repeat": repeat}
+
+
+def run_suite(quick=False, name_filter=None):
+    """Run every case whose name contains `name_filter` and return the results by name."""
+    repeat = QUICK_REPEAT if quick else REPEAT
+    file_counts = QUICK_FILE_COUNTS if quick else WILDCARD_FILE_COUNTS
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="prompt_benchmarks_") as root:
+        directories = []
+        for file_count in file_counts:
+            directory = os.path.join(root, f"files_{file_count}")
+            os.mkdir(directory)
+            write_wildcards(directory, file_count)
+            directories.append((file_count, directory))
+        cases = list(process_cases(directories[0][1])) + list(load_cases(directories))
+        for name, function in cases:
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(function, repeat)
+            print(f"{name:<28} {format_seconds(results[name]['seconds']):>12}", flush=True)
+    return results
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+#endregion
+##################################################
+#region Results
+def save_results(path, results):
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+        file.write("\n")
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)["results"]
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (name, baseline seconds, current seconds, ratio) for every case slower by more than `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["seconds"]
+        ratio = result["seconds"] / before if before else 1.0
+        if ratio > 1.0 + threshold:
+            regressions.append((name, before, result["seconds"], ratio))
+    return regressions
+
+
+#endregion
+##################################################
+#region Main
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the prompt processor and wildcard loader.")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown before a case counts as a regression (default: 0.2, i.e. 20%%)")
+    parser.add_argument("-k", "--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Fewer samples and no 10,000-file load case")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the new baseline")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sys.stdout.reconfigure(encoding="utf-8")
+    results = run_suite(args.quick, args.filter)
+    save_results(args.output, results)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline to create one")
+        return 0
+    regressions = compare(results, load_results(args.baseline), args.threshold)
+    for name, before, after, ratio in regressions:
+        print(f"REGRESSION - {name}: {format_seconds(before)} -> {format_seconds(after)} ({ratio:.2f}x)")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
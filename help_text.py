@@ -31,9 +31,12 @@ Format: __wildcard__   (pulls from wildcard.txt)
 
 Features:
 • Wildcards are loaded from the selected directory
+• Subfolders are included: __people/female/names__ pulls from people/female/names.txt
 • Double-click wildcards in the sidebar to insert
 • # comments in wildcard files are ignored
-• Wildcards can contain variants
+• Lines can be weighted like variant options: 2::red
+• Wildcards can contain variants and other wildcards
+• Nested wildcards expand up to 16 levels deep; a wildcard that refers back to itself is left as written
 • Variants can contain wildcards
 
 Examples:
@@ -59,8 +62,8 @@ Examples:
 • Use nesting for complex combinations
 • Combine samplers for precise control
 • Enable Fixed Seed for testing
-• Stats bar shows character/word/token counts
-• NOTE: This tool is a simplified version of the official Dynamic Prompts tool, some features like Weighting Options, Omitting Bounds, etc. are not available here.
+• Stats bar shows character/word/token counts and the number of possible combinations
+• NOTE: This tool is a simplified version of the official Dynamic Prompts tool, some features like Omitting Bounds, etc. are not available here.
 
 • The official Syntax documentation is available at: https://github.com/adieyal/sd-dynamic-prompts/blob/main/docs/SYNTAX.md
 """
@@ -0,0 +1,9 @@
+"""Allow `python -m tester` to run the headless prompt generator."""
+
+import sys
+
+from tester.cli import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
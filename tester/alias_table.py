@@ -0,0 +1,46 @@
+"""Alias tables for constant-time weighted sampling."""
+
+from array import array
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, one random number per draw.
+
+    All-zero weights draw uniformly.
+    """
+    __slots__ = ('size', 'probability', 'alias')
+
+    def __init__(self, weights):
+        size = len(weights)
+        total = sum(weights)
+        if total <= 0:
+            weights = [1.0] * size
+            total = float(size)
+        scaled = [weight * size / total for weight in weights]
+        self.size = size
+        self.probability = array('d', bytes(8 * size))
+        self.alias = array('L', range(size))
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever remains is 1.0 up to rounding error
+        for index in large + small:
+            self.probability[index] = 1.0
+
+
+    def sample(self, rng):
+        """Return a weighted random index, using a single draw from `rng`."""
+        value = rng.random() * self.size
+        index = int(value)
+        if value - index < self.probability[index]:
+            return index
+        return self.alias[index]
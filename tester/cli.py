@@ -0,0 +1,119 @@
+"""Headless command-line prompt generator. Run with `python -m tester`."""
+
+# Standard Library
+import argparse
+import itertools
+import os
+import sys
+
+# Local Imports
+from tester.export import FORMATS, create_writer, export_prompts, guess_format, open_output
+from tester.processor import TextProcessor
+from tester.template import TemplateSyntaxError, strip_comments
+from tester.wildcard_manager import WildcardManager
+
+
+MODES = ('random', 'cyclical', 'combinatorial')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m tester", description="Generate prompts from a Dynamic Prompts template without the GUI.")
+    parser.add_argument("template", nargs="?", default="-", help="Template file, or - to read from stdin (default)")
+    parser.add_argument("-t", "--text", help="Template text, instead of a file")
+    parser.add_argument("-w", "--wildcards", help="Wildcards folder")
+    parser.add_argument("-n", "--count", type=int, help="Number of prompts (default: 1, or every combination in combinatorial mode)")
+    parser.add_argument("-s", "--seed", type=int, help="Seed for reproducible output")
+    parser.add_argument("-m", "--mode", choices=MODES, default="random", help="Sampling mode (default: random)")
+    parser.add_argument("--start", type=int, default=0, help="Index of the first prompt, for splitting a run into shards")
+    parser.add_argument("--shuffle", action="store_true", help="Combinatorial mode: visit combinations in a seeded order without repeats")
+    parser.add_argument("-u", "--unique", action="store_true", help="Random and cyclical modes: skip repeated prompts, stopping early when no new ones are left")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes for random mode (0 uses every core)")
+    parser.add_argument("--numpy", action="store_true", help="Random mode: draw whole batches at once with NumPy, if installed. Reproducible by seed, but not the same prompts as the default; not combined with --start")
+    parser.add_argument("--separator", default="\n", help="Text written after each prompt in text format (default: newline)")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout). A .gz or .xz suffix compresses it")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="Output format: text, or jsonl with index/seed/template id (default: from the output file name)")
+    return parser
+
+
+def read_template(args):
+    if args.text is not None:
+        return args.text
+    if args.template == "-":
+        return sys.stdin.read()
+    with open(args.template, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def generate(processor, text, args):
+    """Return (index, prompt) pairs for the selected mode."""
+    if args.unique and args.mode != "combinatorial":
+        processor.set_default_sampler(args.mode)
+        count = 1 if args.count is None else args.count
+        # Repeats are skipped, so the indices are not consecutive
+        return processor.process_unique(text, count, args.seed, args.start)
+    return enumerate(generate_prompts(processor, text, args), args.start)
+
+
+def generate_prompts(processor, text, args):
+    """Yield prompts for the selected mode."""
+    if args.mode == "combinatorial":
+        space = processor.expansion_space(text)
+        stop = space.size if args.count is None else args.start + args.count
+        if args.shuffle:
+            return space.shuffled(args.seed, args.start, stop)
+        if args.start == 0:
+            return itertools.islice(space, args.count)
+        return space.iter_range(args.start, stop)
+    count = 1 if args.count is None else args.count
+    processor.set_default_sampler(args.mode)
+    if args.mode == "random" and args.numpy and not args.start:
+        from tester.vectorized import vectorized_batch
+        return vectorized_batch(processor, text, count, args.seed)
+    if args.mode == "random" and args.jobs != 1:
+        # Imported here so single-process runs skip loading the process pool machinery
+        from tester.parallel import parallel_batch
+        return parallel_batch(processor, text, count, args.seed, workers=args.jobs or None, start=args.start)
+    return processor.process_batch(text, count, args.seed, args.start)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sys.stdout.reconfigure(encoding="utf-8")
+    wildcard_manager = WildcardManager(remember_path=False)
+    if args.wildcards:
+        if not os.path.isdir(args.wildcards):
+            print(f"ERROR - Wildcards folder not found: {args.wildcards}", file=sys.stderr)
+            return 2
+        wildcard_manager.set_wildcards_path(args.wildcards)
+    processor = TextProcessor(wildcard_manager)
+    if args.seed is None and (args.mode != "combinatorial" or args.shuffle):
+        # Pick the seed here so it can be recorded with the output
+        args.seed = processor.rng.getrandbits(64)
+    fmt = args.format or guess_format(args.output)
+    try:
+        text = strip_comments(read_template(args))
+        if args.mode == "random" and args.numpy and not args.start:
+            from tester.vectorized import can_vectorize
+            # Record the mode actually used: the batch falls back to process_batch() when it cannot vectorize
+            args.numpy = can_vectorize(processor, text)
+        records = generate(processor, text, args)
+        stream = open_output(args.output) if args.output else sys.stdout
+        try:
+            mode = "random-numpy" if args.mode == "random" and args.numpy and not args.start else args.mode
+            writer = create_writer(stream, fmt, text, args.seed, mode, args.separator)
+            export_prompts(records, writer)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into `head`); stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except TemplateSyntaxError as e:
+        print(f"ERROR - {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(f"ERROR - {e}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,428 @@
+"""Combinatorial operations over the expansion space of a compiled template."""
+
+from bisect import bisect_right
+from hashlib import shake_128
+from itertools import accumulate, combinations
+from math import comb, factorial
+
+from tester.template import MAX_WILDCARD_DEPTH, VariantNode, is_dynamic
+
+
+_EXHAUSTED = object()
+
+
+#endregion
+##################################################
+#region Cardinality
+class Cardinality:
+    """Counts the expansions of a template exactly, without generating them.
+
+    With `ordered`, `N$$` selections count every order of the chosen options, as the random
+    sampler can render them.
+    """
+    def __init__(self, processor, ordered=False):
+        self.processor = processor
+        self.ordered = ordered
+        self.options = {}
+        self.variants = {}
+        self.wildcards = {}
+
+
+    def count(self, template):
+        return self.count_parts(template.parts)
+
+
+    def count_parts(self, parts, path=()):
+        total = 1
+        for part in parts:
+            if part.__class__ is not str:
+                total *= self.count_part(part, path)
+        return total
+
+
+    def count_part(self, part, path):
+        if part.__class__ is VariantNode:
+            return self.count_variant(part, path)[1]
+        return self.count_wildcard(part.name, path)[2]
+
+
+    def count_variant(self, node, path):
+        """Return (option counts, total) for a variant node."""
+        key = (node, path)
+        if key in self.variants:
+            return self.variants[key]
+        counts = [self.count_parts(option, path) for option in node.options]
+        if not node.is_multiple:
+            total = sum(counts)
+        else:
+            min_count = min(node.min_count, len(counts))
+            max_count = min(node.max_count, len(counts))
+            if self.ordered:
+                sums = elementary_symmetric_sums(counts, max_count)
+                total = sum(sums[size] * factorial(size) for size in range(min_count, max_count + 1))
+            elif all(count == 1 for count in counts):
+                total = sum(comb(len(counts), size) for size in range(min_count, max_count + 1))
+            else:
+                sums = elementary_symmetric_sums(counts, max_count)
+                total = sum(sums[min_count:max_count + 1])
+        self.variants[key] = counts, total
+        return counts, total
+
+
+    def get_wildcard_options(self, wildcard_name, path):
+        """Return the options of a wildcard, or None where the renderer would leave it as written."""
+        if wildcard_name in path or len(path) >= MAX_WILDCARD_DEPTH:
+            return None
+        try:
+            return self.options[wildcard_name]
+        except KeyError:
+            options = self.options[wildcard_name] = self.processor.wildcard_manager.get_wildcard_options(wildcard_name)
+            return options
+
+
+    def count_wildcard(self, wildcard_name, path):
+        """Return (options, dynamic, total).
+
+        `dynamic` is None when every line is plain, else (line indices, counts) of the dynamic lines;
+        a plain line counts 1.
+        """
+        key = (wildcard_name, path)
+        if key in self.wildcards:
+            return self.wildcards[key]
+        options = self.get_wildcard_options(wildcard_name, path)
+        dynamic = None
+        if not options:
+            total = 1
+        elif not has_dynamic_lines(options):
+            total = len(options)
+        else:
+            line_path = path + (wildcard_name,)
+            get_line_parts = self.processor.get_line_parts
+            line_indices = []
+            line_counts = []
+            for index, line in dynamic_line_items(options):
+                line_indices.append(index)
+                line_counts.append(self.count_parts(get_line_parts(wildcard_name, options, line), line_path))
+            total = len(options) - len(line_indices) + sum(line_counts)
+            if line_indices:
+                dynamic = line_indices, line_counts
+        self.wildcards[key] = options, dynamic, total
+        return options, dynamic, total
+
+
+def has_dynamic_lines(options):
+    """True if any wildcard line may contain variants or wildcards."""
+    dynamic = getattr(options, 'has_dynamic_lines', None)
+    if dynamic is not None:
+        return dynamic
+    return any(is_dynamic(line) for line in options)
+
+
+def dynamic_line_items(options):
+    """Yield (index, line) for the wildcard lines that may contain variants or wildcards."""
+    line_indices = getattr(options, 'dynamic_line_indices', None)
+    items = enumerate(options) if line_indices is None else ((index, options[index]) for index in line_indices())
+    for index, line in items:
+        if is_dynamic(line):
+            yield index, line
+
+
+def dynamic_lines(options):
+    """Yield the wildcard lines that may contain variants or wildcards."""
+    for _, line in dynamic_line_items(options):
+        yield line
+
+
+def elementary_symmetric_sums(values, max_size):
+    """Return e_0..e_max_size of `values`: the sum of products over every subset of each size."""
+    sums = [1] + [0] * max_size
+    for value in values:
+        for size in range(max_size, 0, -1):
+            sums[size] += sums[size - 1] * value
+    return sums
+
+
+#endregion
+##################################################
+#region ExpansionSpace
+class ExpansionSpace(Cardinality):
+    """Random access into the expansions of a template, indexed in Enumerator order."""
+    def __init__(self, processor, template):
+        super().__init__(processor)
+        self.template = template
+        self.size = self.count(template)
+        self.offsets = {}
+        self.suffix_sums = {}
+
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("expansion index out of range")
+        out = []
+        self.decode_parts(self.template.parts, index, out, ())
+        return ''.join(out)
+
+
+    def __iter__(self):
+        return Enumerator(self.processor).expand(self.template)
+
+
+    def iter_range(self, start=0, stop=None):
+        """Yield the expansions with indices in [start, stop)."""
+        stop = self.size if stop is None else min(stop, self.size)
+        for index in count_range(start, stop):
+            yield self[index]
+
+
+    def shuffled(self, seed=None, start=0, stop=None):
+        """Yield positions [start, stop) of a seeded order that visits each expansion once."""
+        if seed is None:
+            seed = self.processor.rng.getrandbits(64)
+        permutation = IndexPermutation(self.size, seed)
+        stop = self.size if stop is None else min(stop, self.size)
+        for index in count_range(start, stop):
+            yield self[permutation(index)]
+
+
+    def decode_parts(self, parts, index, out, path):
+        choices = [part for part in parts if part.__class__ is not str]
+        digits = [0] * len(choices)
+        for position in range(len(choices) - 1, -1, -1):
+            index, digits[position] = divmod(index, self.count_part(choices[position], path))
+        position = 0
+        for part in parts:
+            if part.__class__ is str:
+                out.append(part)
+                continue
+            if part.__class__ is VariantNode:
+                self.decode_variant(part, digits[position], out, path)
+            else:
+                self.decode_wildcard(part, digits[position], out, path)
+            position += 1
+
+
+    def decode_option(self, option, index, path):
+        out = []
+        self.decode_parts(option, index, out, path)
+        return ''.join(out)
+
+
+    def get_offsets(self, key, counts):
+        offsets = self.offsets.get(key)
+        if offsets is None:
+            offsets = self.offsets[key] = [0, *accumulate(counts)]
+        return offsets
+
+
+    def decode_variant(self, node, index, out, path):
+        counts, _ = self.count_variant(node, path)
+        if not node.is_multiple:
+            offsets = self.get_offsets((node, path), counts)
+            option = bisect_right(offsets, index) - 1
+            self.decode_parts(node.options[option], index - offsets[option], out, path)
+            return
+        option_count = len(counts)
+        min_count = min(node.min_count, option_count)
+        max_count = min(node.max_count, option_count)
+        suffix = self.get_suffix_sums((node, path), counts, max_count)
+        # Find the selection size, then walk combinations in lexicographic order
+        for size in range(min_count, max_count + 1):
+            if index < suffix[size][0]:
+                break
+            index -= suffix[size][0]
+        selected = []
+        scale = 1
+        start = 0
+        for slot in range(size):
+            remaining = size - slot - 1
+            for option in range(start, option_count):
+                block = scale * counts[option] * suffix[remaining][option + 1]
+                if index < block:
+                    break
+                index -= block
+            selected.append(option)
+            scale *= counts[option]
+            start = option + 1
+        # What is left indexes the product of the selected options
+        values = [''] * size
+        for slot in range(size - 1, -1, -1):
+            option = selected[slot]
+            index, digit = divmod(index, counts[option])
+            values[slot] = self.decode_option(node.options[option], digit, path)
+        out.append(node.separator.join(values))
+
+
+    def get_suffix_sums(self, key, counts, max_size):
+        """Return table[size][start]: the weighted combinations of `size` options from counts[start:]."""
+        table = self.suffix_sums.get(key)
+        if table is None:
+            option_count = len(counts)
+            table = [[1] * (option_count + 1)]
+            for size in range(1, max_size + 1):
+                previous = table[-1]
+                row = [0] * (option_count + 1)
+                for start in range(option_count - 1, -1, -1):
+                    row[start] = row[start + 1] + counts[start] * previous[start + 1]
+                table.append(row)
+            self.suffix_sums[key] = table
+        return table
+
+
+    def decode_wildcard(self, node, index, out, path):
+        wildcard_name = node.name
+        options, dynamic, _ = self.count_wildcard(wildcard_name, path)
+        if not options:
+            out.append(f"__{wildcard_name}__")
+            return
+        if dynamic is None:
+            out.append(options[index])
+            return
+        line_indices, line_counts = dynamic
+        starts = self.get_line_starts((wildcard_name, path), line_indices, line_counts)
+        # Plain lines count 1, so only the dynamic lines need an offset
+        position = bisect_right(starts, index) - 1
+        if position < 0:
+            out.append(options[index])
+            return
+        offset = index - starts[position]
+        if offset < line_counts[position]:
+            parts = self.processor.get_line_parts(wildcard_name, options, options[line_indices[position]])
+            self.decode_parts(parts, offset, out, path + (wildcard_name,))
+        else:
+            out.append(options[line_indices[position] + 1 + offset - line_counts[position]])
+
+
+    def get_line_starts(self, key, line_indices, line_counts):
+        """Return the first expansion index of each dynamic line."""
+        starts = self.offsets.get(key)
+        if starts is None:
+            starts = self.offsets[key] = [line_index + extra for line_index, extra in zip(line_indices, accumulate((count - 1 for count in line_counts), initial=0))]
+        return starts
+
+
+class IndexPermutation:
+    """A seeded bijection on range(size): a Feistel network with cycle walking."""
+    ROUNDS = 4
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.half_bytes = (self.half_bits + 7) // 8
+        self.mask = (1 << self.half_bits) - 1
+        self.hasher = shake_128(f"{seed}:".encode())
+
+
+    def round_function(self, round_index, value):
+        hasher = self.hasher.copy()
+        hasher.update(bytes((round_index,)) + value.to_bytes(self.half_bytes, 'little'))
+        return int.from_bytes(hasher.digest(self.half_bytes), 'little') & self.mask
+
+
+    def encrypt(self, value):
+        left = value >> self.half_bits
+        right = value & self.mask
+        for round_index in range(self.ROUNDS):
+            left, right = right, left ^ self.round_function(round_index, right)
+        return (left << self.half_bits) | right
+
+
+    def __call__(self, index):
+        value = self.encrypt(index)
+        while value >= self.size:
+            value = self.encrypt(value)
+        return value
+
+
+def count_range(start, stop):
+    """Like range(), but for bounds beyond sys.maxsize."""
+    index = start
+    while index < stop:
+        yield index
+        index += 1
+
+
+#endregion
+##################################################
+#region Enumerator
+class Enumerator(Cardinality):
+    """Lazily yields every expansion of a template, last choice point fastest."""
+    def expand(self, template):
+        return self.expand_parts(template.parts, ())
+
+
+    def expand_parts(self, parts, path):
+        positions = [index for index, part in enumerate(parts) if part.__class__ is not str]
+        if not positions:
+            yield ''.join(parts)
+            return
+        pieces = list(parts)
+        factories = [self.part_factory(parts[index], path) for index in positions]
+        for values in lazy_product(factories):
+            for index, value in zip(positions, values):
+                pieces[index] = value
+            yield ''.join(pieces)
+
+
+    def part_factory(self, part, path):
+        if part.__class__ is VariantNode:
+            return lambda: self.expand_variant(part, path)
+        return lambda: self.expand_wildcard(part, path)
+
+
+    def expand_variant(self, node, path):
+        options = node.options
+        if not node.is_multiple:
+            for option in options:
+                yield from self.expand_parts(option, path)
+            return
+        min_count = min(node.min_count, len(options))
+        max_count = min(node.max_count, len(options))
+        separator = node.separator
+        for count in range(min_count, max_count + 1):
+            for selected in combinations(options, count):
+                factories = [self.option_factory(option, path) for option in selected]
+                for values in lazy_product(factories):
+                    yield separator.join(values)
+
+
+    def option_factory(self, option, path):
+        return lambda: self.expand_parts(option, path)
+
+
+    def expand_wildcard(self, node, path):
+        wildcard_name = node.name
+        options = self.get_wildcard_options(wildcard_name, path)
+        if not options:
+            yield f"__{wildcard_name}__"
+            return
+        line_path = path + (wildcard_name,)
+        get_line_parts = self.processor.get_line_parts
+        for line in options:
+            if is_dynamic(line):
+                yield from self.expand_parts(get_line_parts(wildcard_name, options, line), line_path)
+            else:
+                yield line
+
+
+def lazy_product(factories):
+    """Lazily yield the Cartesian product of re-creatable iterators.
+
+    The yielded list is reused and must be consumed before the next step.
+    """
+    iterators = [factory() for factory in factories]
+    values = [next(iterator) for iterator in iterators]
+    while True:
+        yield values
+        position = len(iterators) - 1
+        while position >= 0:
+            value = next(iterators[position], _EXHAUSTED)
+            if value is not _EXHAUSTED:
+                values[position] = value
+                break
+            iterators[position] = factories[position]()
+            values[position] = next(iterators[position])
+            position -= 1
+        else:
+            return
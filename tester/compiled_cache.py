@@ -0,0 +1,214 @@
+"""Persistent cache of parsed wildcard files, so unchanged files are not parsed again."""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from tester.mapped_wildcard import from_little_endian, to_little_endian
+
+
+CACHE_MAGIC = b'WCCC'
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<4sI')
+ENTRY_HEADER = struct.Struct('<IQqQQB16s')
+DIGEST_SIZE = 16
+DIGEST_CHUNK_SIZE = 1024 * 1024
+FLAG_WEIGHTED = 1
+FLAG_WIDE_OFFSETS = 2
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as file:
+        while chunk := file.read(DIGEST_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def read_entry(data, position):
+    """Return (end, entry) for the entry at `position`, with entry None if `data` ends inside it.
+
+    Returns None if `data` ends inside the entry header.
+    """
+    if position + ENTRY_HEADER.size > len(data):
+        return None
+    path_length, size, mtime_ns, count, buffer_length, flags, digest = ENTRY_HEADER.unpack_from(data, position)
+    path_start = position + ENTRY_HEADER.size
+    buffer_start = path_start + path_length
+    offsets_start = buffer_start + buffer_length
+    weights_start = offsets_start + (count + 1) * (8 if flags & FLAG_WIDE_OFFSETS else 4)
+    end = weights_start + (count * 8 if flags & FLAG_WEIGHTED else 0)
+    if end > len(data):
+        return end, None
+    path = bytes(data[path_start:buffer_start]).decode('utf-8')
+    spans = (buffer_start, offsets_start, weights_start, flags)
+    return end, (path, size, mtime_ns, digest, spans)
+
+
+def read_payload(data, spans, end):
+    buffer_start, offsets_start, weights_start, flags = spans
+    buffer = bytes(data[buffer_start:offsets_start])
+    offsets = from_little_endian('Q' if flags & FLAG_WIDE_OFFSETS else 'I', data[offsets_start:weights_start])
+    weights = from_little_endian('d', data[weights_start:end]) if flags & FLAG_WEIGHTED else None
+    return buffer, offsets, weights
+
+
+#endregion
+##################################################
+#region CompiledCache
+class CompiledCache:
+    """Append-only file of parsed wildcards, keyed by path, size, modification time and content hash.
+
+    The file is read once to index the entries; an entry's data is read only when looked up.
+    It is rewritten without stale entries when they take up most of it.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+
+
+    def load(self):
+        self.entries = {}
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"ERROR - CompiledCache.load(): {e}", file=sys.stderr)
+            return
+        view = memoryview(data)
+        found = {}
+        position = CACHE_HEADER.size
+        valid = len(data) >= position and CACHE_HEADER.unpack_from(data) == (CACHE_MAGIC, CACHE_VERSION)
+        while valid:
+            result = read_entry(view, position)
+            if result is None or result[1] is None:
+                break
+            end, (path, size, mtime_ns, digest, spans) = result
+            found[path] = (position, end, size, mtime_ns, digest)
+            position = end
+        live = {path: entry for path, entry in found.items() if os.path.exists(path)}
+        live_bytes = sum(end - start for start, end, *_ in live.values())
+        # Also drops a cut-short entry left by an interrupted append
+        if not valid or position != len(data) or len(data) - CACHE_HEADER.size > 2 * live_bytes:
+            if self.rewrite(view[start:end] for start, end, *_ in live.values()):
+                position = CACHE_HEADER.size
+                for path, (start, end, *fields) in live.items():
+                    live[path] = (position, position + end - start, *fields)
+                    position += end - start
+        for path, (start, end, size, mtime_ns, digest) in live.items():
+            self.entries[path] = [size, mtime_ns, digest, start]
+
+
+    def read(self, path, position):
+        """Read the entry at `position`, or None if it no longer belongs to `path`."""
+        try:
+            with open(self.path, 'rb') as file:
+                file.seek(position)
+                header = file.read(ENTRY_HEADER.size)
+                result = read_entry(header, 0)
+                if result is None:
+                    return None
+                file.seek(position)
+                data = file.read(result[0])
+        except OSError as e:
+            print(f"ERROR - CompiledCache.read(): {e}", file=sys.stderr)
+            return None
+        end, entry = read_entry(data, 0)
+        if entry is None or entry[0] != path:
+            return None
+        return entry, read_payload(memoryview(data), entry[4], end)
+
+
+    def lookup(self, path, size, mtime_ns):
+        """Return (buffer, offsets, weights) stored for the file, or None if there is no current entry.
+
+        An entry whose file only has a new modification time is used if the content hash matches.
+        """
+        if self.entries is None:
+            self.load()
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != size:
+            return None
+        digest = None
+        if entry[1] != mtime_ns:
+            try:
+                digest = file_digest(path)
+            except OSError:
+                return None
+            if digest != entry[2]:
+                return None
+        result = self.read(path, entry[3])
+        # Another session may have rewritten the file since it was indexed
+        if result is None or result[0][1:4] != tuple(entry[:3]):
+            self.entries.pop(path, None)
+            return None
+        payload = result[1]
+        if digest is not None:
+            # Record the new time so the next start skips the hash
+            position = self.append(path, size, mtime_ns, digest, *payload)
+            self.entries[path] = [size, mtime_ns, digest, position] if position is not None else entry
+        return payload
+
+
+    def store(self, path, size, mtime_ns, buffer, offsets, weights):
+        """Append the parsed options of a file, unless an entry for this version of it exists."""
+        if self.entries is None:
+            self.load()
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+            return
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            print(f"ERROR - CompiledCache.store(): {e}", file=sys.stderr)
+            return
+        if weights is not None and not isinstance(weights, array):
+            weights = array('d', weights)
+        position = self.append(path, size, mtime_ns, digest, buffer, offsets, weights)
+        if position is not None:
+            self.entries[path] = [size, mtime_ns, digest, position]
+
+
+    def append(self, path, size, mtime_ns, digest, buffer, offsets, weights):
+        """Append an entry and return its position in the file, or None if it could not be written."""
+        if offsets.itemsize not in (4, 8):
+            offsets = array('Q', offsets)
+        flags = (FLAG_WEIGHTED if weights is not None else 0) | (FLAG_WIDE_OFFSETS if offsets.itemsize == 8 else 0)
+        encoded_path = path.encode('utf-8')
+        parts = [
+            ENTRY_HEADER.pack(len(encoded_path), size, mtime_ns, len(offsets) - 1, len(buffer), flags, digest),
+            encoded_path,
+            buffer,
+            to_little_endian(offsets),
+        ]
+        if weights is not None:
+            parts.append(to_little_endian(weights))
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'ab') as file:
+                if file.tell() == 0:
+                    file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION))
+                position = file.tell()
+                file.write(b''.join(parts))
+        except OSError as e:
+            print(f"ERROR - CompiledCache.append(): {e}", file=sys.stderr)
+            return None
+        return position
+
+
+    def rewrite(self, chunks):
+        temporary_path = self.path + '.tmp'
+        try:
+            with open(temporary_path, 'wb') as file:
+                file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION))
+                for chunk in chunks:
+                    file.write(chunk)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            print(f"ERROR - CompiledCache.rewrite(): {e}", file=sys.stderr)
+            return False
+        return True
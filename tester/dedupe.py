@@ -0,0 +1,82 @@
+"""Membership sets for discarding repeated prompts while a batch is generated."""
+
+import math
+from hashlib import blake2b
+
+
+EXACT_LIMIT = 1_000_000
+ERROR_RATE = 0.001
+MASK32 = (1 << 32) - 1
+
+
+def prompt_digest(prompt):
+    """64-bit digest of a prompt. Two different prompts share one with negligible probability."""
+    return int.from_bytes(blake2b(prompt.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit digests, using the two 32-bit halves for double hashing."""
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+
+    def add(self, digest):
+        """Add a digest and return True if it was not already (probably) present."""
+        bits = self.bits
+        size = self.size
+        step = (digest >> 32) | 1
+        position = digest & MASK32
+        added = False
+        for _ in range(self.hash_count):
+            index = position % size
+            mask = 1 << (index & 7)
+            if not bits[index >> 3] & mask:
+                bits[index >> 3] |= mask
+                added = True
+            position += step
+        return added
+
+
+class SeenSet:
+    """Records which prompts have been generated.
+
+    Digests are kept in an exact set up to `exact_limit`, then moved into a Bloom filter.
+    """
+    def __init__(self, capacity, exact_limit=EXACT_LIMIT, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.exact_limit = exact_limit
+        self.error_rate = error_rate
+        self.digests = set()
+        self.bloom = None
+        self.count = 0
+
+
+    def add(self, prompt):
+        """Record a prompt and return True if it had not been seen before."""
+        digest = prompt_digest(prompt)
+        if self.bloom is not None:
+            added = self.bloom.add(digest)
+        elif digest in self.digests:
+            added = False
+        else:
+            self.digests.add(digest)
+            added = True
+            if len(self.digests) > self.exact_limit:
+                self.to_bloom()
+        if added:
+            self.count += 1
+        return added
+
+
+    def to_bloom(self):
+        self.bloom = BloomFilter(max(self.capacity, len(self.digests)), self.error_rate)
+        for digest in self.digests:
+            self.bloom.add(digest)
+        self.digests = set()
+
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,80 @@
+"""Streaming export of generated prompts to plain text or JSONL files."""
+
+# Standard Library
+import gzip
+import hashlib
+import json
+import lzma
+
+
+FORMATS = ('text', 'jsonl')
+GZIP_LEVEL = 6
+
+
+def open_output(path):
+    """Open `path` for writing text, compressing it when it ends in .gz or .xz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=GZIP_LEVEL)
+    if path.endswith('.xz'):
+        return lzma.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    """Pick the format from a file name such as prompts.jsonl or prompts.jsonl.gz."""
+    if path:
+        for suffix in ('.gz', '.xz'):
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+        if path.endswith('.jsonl'):
+            return 'jsonl'
+    return 'text'
+
+
+def template_id(text):
+    """Short stable identifier for a template, recorded with each JSONL record."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class PromptWriter:
+    """Writes one prompt at a time to a text stream, followed by a separator."""
+    def __init__(self, stream, separator='\n'):
+        self.stream = stream
+        self.separator = separator
+
+
+    def write(self, index, prompt):
+        self.stream.write(prompt)
+        self.stream.write(self.separator)
+
+
+class JsonlWriter(PromptWriter):
+    """Writes one JSON object per line; process_prompt(template, seed, index) regenerates random prompts."""
+    def __init__(self, stream, template_text, seed=None, mode=None):
+        super().__init__(stream)
+        self.record = {"template_id": template_id(template_text), "mode": mode, "seed": seed, "index": 0, "prompt": ""}
+        self.encode = json.JSONEncoder(ensure_ascii=False).encode
+
+
+    def write(self, index, prompt):
+        record = self.record
+        record["index"] = index
+        record["prompt"] = prompt
+        self.stream.write(self.encode(record))
+        self.stream.write('\n')
+
+
+def create_writer(stream, fmt, template_text, seed=None, mode=None, separator='\n'):
+    if fmt == 'jsonl':
+        return JsonlWriter(stream, template_text, seed, mode)
+    return PromptWriter(stream, separator)
+
+
+def export_prompts(records, writer):
+    """Write (index, prompt) pairs as they are generated and return how many were written."""
+    written = 0
+    write = writer.write
+    for index, prompt in records:
+        write(index, prompt)
+        written += 1
+    return written
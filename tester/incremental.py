@@ -0,0 +1,79 @@
+"""Segment-by-segment rendering for live mode, re-rendering only what changed."""
+
+from collections import Counter
+
+from tester.dedupe import prompt_digest
+from tester.parallel import collect_wildcards, is_stateless
+from tester.processor import prompt_seed
+from tester.template import TemplateSyntaxError, split_segments
+
+
+class SegmentRenderer:
+    """Renders input text one segment at a time, reusing the output of unchanged segments.
+
+    A segment's seed depends only on the base seed and its own text, so editing one line leaves
+    the others unchanged. Segments using cyclical or combinatorial samplers are always rendered.
+    """
+    def __init__(self, processor):
+        self.processor = processor
+        self.outputs = {}
+        self.counts = {}
+        self.stateless = {}
+
+
+    def clear(self):
+        """Forget cached output, e.g. after the wildcards changed."""
+        self.outputs.clear()
+        self.counts.clear()
+        self.stateless.clear()
+
+
+    def segment_seed(self, seed, segment, occurrence):
+        return prompt_seed(seed ^ prompt_digest(segment), occurrence)
+
+
+    def is_stateless(self, segment, stateless):
+        key = (segment, self.processor.default_sampler)
+        result = self.stateless.get(key)
+        if result is None:
+            template = self.processor.compile(segment)
+            result = is_stateless(self.processor, template, collect_wildcards(self.processor, template))
+        stateless[key] = result
+        return result
+
+
+    def render(self, text, seed, cancelled=None):
+        """Return (segment outputs, combination count), or None if `cancelled()` became true."""
+        processor = self.processor
+        segments = split_segments(text)
+        outputs = {}
+        counts = {}
+        stateless = {}
+        seen = Counter()
+        rendered = []
+        combination_count = 1
+        try:
+            for segment in segments:
+                if cancelled is not None and cancelled():
+                    return None
+                occurrence = seen[segment]
+                seen[segment] += 1
+                key = (segment, occurrence, seed)
+                output = self.outputs.get(key) if self.is_stateless(segment, stateless) else None
+                if output is None:
+                    output = processor.process(segment, seed=self.segment_seed(seed, segment, occurrence))
+                outputs[key] = output
+                rendered.append(output)
+                count = self.counts.get(segment)
+                if count is None:
+                    count = processor.count_expansions(segment)
+                counts[segment] = count
+                combination_count *= count
+        except TemplateSyntaxError:
+            # Report the error against the whole input rather than one segment
+            processor.compile('\n'.join(segments))
+            raise
+        self.outputs = outputs
+        self.counts = counts
+        self.stateless = stateless
+        return rendered, combination_count
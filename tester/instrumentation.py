@@ -0,0 +1,116 @@
+"""Opt-in call counters and timings for the hot paths of the Prompt Tester."""
+
+import json
+import threading
+import time
+
+
+#endregion
+##################################################
+#region Counters
+class Counter:
+    """Call count and timings of one method. `own` excludes time spent in other instrumented methods."""
+    __slots__ = ('calls', 'total', 'own', 'active')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.own = 0.0
+        self.active = 0
+
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "own_ms": round(self.own * 1000, 3),
+            "own_mean_us": round(self.own / self.calls * 1e6, 3) if self.calls else 0.0,
+        }
+
+
+class Instrumentation:
+    """Wraps registered methods with timing wrappers while enabled.
+
+    Wrappers are instance attributes removed on disable(), so disabled instrumentation costs nothing.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.targets = []
+        self.counters = {}
+        self.local = threading.local()
+
+
+    def add(self, instance, method_name, label=None):
+        """Register a method of `instance` to be timed when instrumentation is enabled."""
+        label = label or f"{type(instance).__name__}.{method_name}"
+        self.targets.append((instance, method_name, label))
+        self.counters.setdefault(label, Counter())
+        if self.enabled:
+            self.install(instance, method_name, label)
+
+
+    def install(self, instance, method_name, label):
+        setattr(instance, method_name, self.wrap(getattr(instance, method_name), self.counters[label]))
+
+
+    def wrap(self, function, counter):
+        local = self.local
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            stack = getattr(local, 'stack', None)
+            if stack is None:
+                stack = local.stack = []
+            counter.calls += 1
+            counter.active += 1
+            stack.append(0.0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                counter.own += elapsed - stack.pop()
+                counter.active -= 1
+                if not counter.active:
+                    counter.total += elapsed
+                if stack:
+                    stack[-1] += elapsed
+        return wrapper
+
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        for instance, method_name, label in self.targets:
+            self.install(instance, method_name, label)
+
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for instance, method_name, label in self.targets:
+            instance.__dict__.pop(method_name, None)
+
+
+    def reset(self):
+        for counter in self.counters.values():
+            counter.calls = 0
+            counter.total = 0.0
+            counter.own = 0.0
+
+
+    def snapshot(self):
+        """Return the counters as a dict of plain values, keyed by label."""
+        return {label: counter.to_dict() for label, counter in self.counters.items()}
+
+
+    def to_json(self):
+        return json.dumps({"enabled": self.enabled, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "counters": self.snapshot()}, indent=2)
+
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.to_json())
+            file.write("\n")
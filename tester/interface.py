@@ -29,12 +29,14 @@ class Interface:
         self.always_on_top_var = tk.BooleanVar(value=False)
         self.wildcard_path_var = tk.StringVar(value=self.wildcard_manager.wildcards_path)
         self.show_wildcards_var = tk.BooleanVar(value=True)
+        self.watch_wildcards_var = tk.BooleanVar(value=False)
         self.wildcards_list = None
         self.saved_prompts_search_var = tk.StringVar()
         self.search_in_filename_var = tk.BooleanVar(value=True)
         self.search_in_prompt_var = tk.BooleanVar(value=True)
+        self.instrumentation_var = tk.BooleanVar(value=False)
         # Actions handler
-        self.actions = InterfaceActions(self, parent.wildcard_manager, parent.process_text)
+        self.actions = InterfaceActions(self, parent.wildcard_manager, parent.process_text, parent.instrumentation)
         # Setup interface
         self.setup_interface()
 
@@ -89,6 +91,10 @@ class Interface:
         saved_prompts_tab = ttk.Frame(control_notebook, padding=(10, 5, 10, 5))
         control_notebook.add(saved_prompts_tab, text="Saved Prompts")
         self.setup_saved_prompts_frame(saved_prompts_tab)
+        # Debug tab
+        debug_tab = ttk.Frame(control_notebook, padding=(10, 5, 10, 5))
+        control_notebook.add(debug_tab, text="Debug")
+        self.setup_debug_frame(debug_tab)
 
 
     def setup_control_options(self, parent):
@@ -128,11 +134,14 @@ class Interface:
         show_wildcards_check = ttk.Checkbutton(wildcard_options_frame, text="Show Wildcards", variable=self.show_wildcards_var, command=self.actions.toggle_wildcards_list)
         show_wildcards_check.pack(side="left", pady=5, fill="x")
         ToolTip.create(widget=show_wildcards_check, text="Show/Hide wildcards list", delay=250, padx=5, pady=5)
+        watch_wildcards_check = ttk.Checkbutton(wildcard_options_frame, text="Watch", variable=self.watch_wildcards_var, command=self.actions.toggle_wildcard_watcher)
+        watch_wildcards_check.pack(side="left", pady=5, padx=(5, 0), fill="x")
+        ToolTip.create(widget=watch_wildcards_check, text="Reload wildcard files automatically when they are edited, added or removed", delay=250, padx=5, pady=5)
         refresh_button = ttk.Button(wildcard_options_frame, text="⟳", width=2, command=self.actions.refresh_wildcards)
         refresh_button.pack(side="right", fill="x", pady=5)
-        ToolTip.create(widget=refresh_button, text="Refresh wildcards", delay=250, padx=5, pady=5)
+        ToolTip.create(widget=refresh_button, text="Refresh wildcards (reloads changed files only)", delay=250, padx=5, pady=5)
         # Wildcards list
-        self.wildcards_list = tk.Listbox(parent, height=6)
+        self.wildcards_list = ttk.Treeview(parent, height=6, show="tree", selectmode="browse")
         self.wildcards_list.pack(fill="both", expand=True, pady=5)
         self.create_wildcards_context_menu(self.wildcards_list)
         self.wildcards_list.bind('<Double-Button-1>', self.actions.on_wildcard_double_click)
@@ -169,6 +178,35 @@ class Interface:
         self.actions.populate_saved_prompts_list()
 
 
+    def setup_debug_frame(self, parent):
+        # Enable
+        instrumentation_check = ttk.Checkbutton(parent, text="Instrumentation", variable=self.instrumentation_var, command=self.actions.toggle_instrumentation)
+        instrumentation_check.pack(pady=5, fill="x")
+        ToolTip.create(widget=instrumentation_check, text="Count calls and time wildcard loading, parsing, sampling and output updates.\nAdds a little overhead while enabled.", delay=250, padx=5, pady=5)
+        # Reset and Save
+        button_frame = ttk.Frame(parent)
+        button_frame.pack(fill="x", pady=2)
+        reset_button = ttk.Button(button_frame, text="Reset", command=self.actions.reset_instrumentation)
+        reset_button.pack(side="left", fill="x", expand=True, padx=(0, 2))
+        ToolTip.create(widget=reset_button, text="Clear all counters", delay=250, padx=5, pady=5)
+        save_button = ttk.Button(button_frame, text="Save JSON...", command=self.actions.save_instrumentation)
+        save_button.pack(side="right", fill="x", expand=True, padx=(2, 0))
+        ToolTip.create(widget=save_button, text="Save the counters as JSON", delay=250, padx=5, pady=5)
+        # Counters
+        columns = ("calls", "total", "own")
+        self.debug_tree = ttk.Treeview(parent, columns=columns, height=6)
+        self.debug_tree.heading("#0", text="Stage")
+        self.debug_tree.heading("calls", text="Calls")
+        self.debug_tree.heading("total", text="Total ms")
+        self.debug_tree.heading("own", text="Own ms")
+        self.debug_tree.column("#0", width=160, stretch=True)
+        for column in columns:
+            self.debug_tree.column(column, width=60, anchor="e", stretch=False)
+        self.debug_tree.pack(fill="both", expand=True, pady=5)
+        ToolTip.create(widget=self.debug_tree, text="Total: time including nested calls. Own: time excluding other stages listed here.", delay=250, padx=5, pady=5)
+        self.actions.update_debug_panel()
+
+
 
 # --------------------------------------
 # Primary
@@ -200,7 +238,7 @@ class Interface:
         self.output_text.pack(fill="both", expand=True)
         self.stats_bar = ttk.Label(text_container, text="Characters: 0 | Words: 0 | Tokens: ~0", anchor="w")
         self.stats_bar.pack(fill="x", pady=(5, 0))
-        ToolTip.create(widget=self.stats_bar, text="Character, word, and estimated token counts", delay=250, padx=5, pady=5)
+        ToolTip.create(widget=self.stats_bar, text="Character, word, and estimated token counts, plus the number of possible combinations of the input", delay=250, padx=5, pady=5)
         output_scrollbar = ttk.Scrollbar(output_frame, orient="vertical", command=self.output_text.yview)
         output_scrollbar.pack(side="right", fill="y")
         self.output_text.config(yscrollcommand=output_scrollbar.set)
@@ -269,31 +307,35 @@ class Interface:
         context_menu = Menu(self.root, tearoff=0)
 
         def copy_wildcard():
-            if widget.curselection():
-                selected = widget.get(widget.curselection())
+            selected = self.actions.get_selected_wildcard()
+            if selected:
                 self.root.clipboard_clear()
                 self.root.clipboard_append(f"__{selected}__")
 
         def insert_wildcard():
-            if widget.curselection():
-                selected = widget.get(widget.curselection())
+            selected = self.actions.get_selected_wildcard()
+            if selected:
                 self.input_text.insert(tk.INSERT, f"__{selected}__")
                 self.actions.on_text_change()
 
         def open_wildcard():
-            if widget.curselection() and self.wildcard_manager.wildcards_path:
-                selected = widget.get(widget.curselection())
-                file_path = os.path.join(self.wildcard_manager.wildcards_path, f"{selected}.txt")
-                if os.path.exists(file_path):
+            selected = self.actions.get_selected_wildcard()
+            if selected and self.wildcard_manager.wildcards_path:
+                file_path = self.wildcard_manager.wildcard_files.get(selected)
+                if file_path and os.path.exists(file_path):
                     os.startfile(file_path)
 
         def update_menu_state():
-            state = "normal" if widget.curselection() else "disabled"
+            state = "normal" if self.actions.get_selected_wildcard() else "disabled"
             context_menu.entryconfig("Copy", state=state)
             context_menu.entryconfig("Insert Selection", state=state)
             context_menu.entryconfig("Open", state=state)
 
         def show_context_menu(event):
+            # Select the row under the cursor, as a Listbox would on right-click
+            row = widget.identify_row(event.y)
+            if row:
+                widget.selection_set(row)
             update_menu_state()
             context_menu.tk_popup(event.x_root, event.y_root)
             return "break"
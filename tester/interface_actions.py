@@ -2,59 +2,141 @@
 
 # Standard Library
 import os
-import re
 import json
+import sys
 
 
 # Standard Library - GUI
 from tkinter import filedialog, simpledialog
 import tkinter as tk
 
+# Local Imports
+from tester.template import strip_comments
+
+
+LIVE_DEBOUNCE_MS = 150
+WATCH_POLL_MS = 250
+
 
 class InterfaceActions:
-    def __init__(self, interface, wildcard_manager, process_callback):
+    def __init__(self, interface, wildcard_manager, process_callback, instrumentation=None):
         self.interface = interface
         self.wildcard_manager = wildcard_manager
         self.process_text_callback = process_callback
+        self.instrumentation = instrumentation
+        self.live_after_id = None
+        self.output_lines = None
+        self.watch_after_id = None
         self.saved_prompts_dict = {}
+        self.combination_count = None
         self.json_path = "config\\prompts.json"
 
 
     def on_text_change(self, event=None):
         if self.interface.live_var.get():
-            self.process_text_callback()
+            self.schedule_live_processing()
         self.update_save_button_state()
 
 
+    def schedule_live_processing(self):
+        """Process once typing pauses for LIVE_DEBOUNCE_MS, instead of on every key release."""
+        root = self.interface.root
+        if self.live_after_id is not None:
+            root.after_cancel(self.live_after_id)
+        self.live_after_id = root.after(LIVE_DEBOUNCE_MS, self.run_live_processing)
+
+
+    def run_live_processing(self):
+        self.live_after_id = None
+        self.process_text_callback(live=True)
+
+
     def display_text_output(self, text):
         if self.interface.collapse_output_var.get():
             text = ' '.join(text.split())
         self.interface.output_text.delete("1.0", "end")
         self.interface.output_text.insert("end", text)
+        self.interface.output_text.edit_modified(False)
+        self.output_lines = text.split('\n')
         self.update_stats_bar(text)
 
 
+    def display_segments(self, segments):
+        """Show rendered segments, rewriting only the output lines that changed."""
+        text = '\n'.join(segments)
+        widget = self.interface.output_text
+        # Fall back to a full redraw when collapsing, or when the output was edited by hand
+        if self.interface.collapse_output_var.get() or self.output_lines is None or widget.edit_modified():
+            self.display_text_output(text)
+            return
+        old_lines = self.output_lines
+        new_lines = text.split('\n')
+        old_count = len(old_lines)
+        new_count = len(new_lines)
+        limit = min(old_count, new_count)
+        prefix = 0
+        while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_lines[old_count - 1 - suffix] == new_lines[new_count - 1 - suffix]:
+            suffix += 1
+        middle = new_lines[prefix:new_count - suffix]
+        if prefix == old_count == new_count:
+            pass
+        elif suffix:
+            widget.delete(f"{prefix + 1}.0", f"{old_count - suffix + 1}.0")
+            widget.insert(f"{prefix + 1}.0", ''.join(line + '\n' for line in middle))
+        elif prefix:
+            widget.delete(f"{prefix}.end", "end-1c")
+            widget.insert(f"{prefix}.end", ''.join('\n' + line for line in middle))
+        else:
+            widget.delete("1.0", "end")
+            widget.insert("1.0", text)
+        widget.edit_modified(False)
+        self.output_lines = new_lines
+        self.update_stats_bar(text)
+
+
+    def display_error(self, error):
+        self.interface.stats_bar.config(text=f"Error: {error}")
+
+
     def get_input_text(self):
-        text = self.interface.input_text.get("1.0", "end").strip()
-        lines = [line for line in text.splitlines() if not line.strip().startswith('#')]
-        return re.sub(r'\n\s*\n', '\n\n', '\n'.join(lines))
+        return strip_comments(self.interface.input_text.get("1.0", "end"))
+
+
+    def get_raw_input_text(self):
+        """Return the input as typed, comments included; SegmentRenderer strips them per line."""
+        return self.interface.input_text.get("1.0", "end")
 
 
     def clear_all_text(self):
         self.interface.input_text.delete("1.0", "end")
         self.interface.output_text.delete("1.0", "end")
+        self.output_lines = None
+        self.combination_count = None
         self.update_stats_bar("")
 
 
     def browse_wildcards_path(self):
         path = filedialog.askdirectory(title="Select Wildcards Folder", initialdir=os.getcwd())
         if path:
-            self.wildcard_manager.set_wildcards_path(path)
-            self.interface.wildcard_path_var.set(path)
-            self.update_wildcard_open_button_state()
-            self.interface.wildcard_path_tooltip.config(text=path)
-            if self.interface.show_wildcards_var.get():
-                self.update_wildcards_list()
+            self.interface.parent.worker.submit_task(self.set_wildcards_path, self.on_wildcards_path_set, path)
+
+
+    def set_wildcards_path(self, path):
+        """Runs on the worker thread."""
+        self.wildcard_manager.set_wildcards_path(path)
+        self.interface.parent.segment_renderer.clear()
+        return path
+
+
+    def on_wildcards_path_set(self, path):
+        self.interface.wildcard_path_var.set(path)
+        self.update_wildcard_open_button_state()
+        self.interface.wildcard_path_tooltip.config(text=path)
+        if self.interface.show_wildcards_var.get():
+            self.update_wildcards_list()
 
 
     def toggle_wildcards_list(self):
@@ -66,16 +148,35 @@ class InterfaceActions:
 
 
     def update_wildcards_list(self):
+        """List the wildcards as a tree of folders. Wildcard rows use the wildcard name as their id; folder ids end with `/`."""
         if self.wildcard_manager.wildcards_path:
-            self.interface.wildcards_list.delete(0, "end")
+            tree = self.interface.wildcards_list
+            tree.delete(*tree.get_children())
+            folders = set()
             for wildcard in self.wildcard_manager.get_available_wildcards():
-                self.interface.wildcards_list.insert("end", wildcard)
+                parent = ""
+                *path, name = wildcard.split('/')
+                for index, folder_name in enumerate(path):
+                    folder_id = '/'.join(path[:index + 1]) + '/'
+                    if folder_id not in folders:
+                        tree.insert(parent, "end", iid=folder_id, text=folder_name)
+                        folders.add(folder_id)
+                    parent = folder_id
+                tree.insert(parent, "end", iid=wildcard, text=name)
             self.interface.wildcard_path_tooltip.config(text=self.wildcard_manager.wildcards_path)
 
 
+    def get_selected_wildcard(self):
+        """Return the name of the selected wildcard, or None if nothing or a folder is selected."""
+        selection = self.interface.wildcards_list.selection()
+        if selection and selection[0] in self.wildcard_manager.available_wildcards:
+            return selection[0]
+        return None
+
+
     def on_wildcard_double_click(self, event):
-        if self.interface.wildcards_list.curselection():
-            selected = self.interface.wildcards_list.get(self.interface.wildcards_list.curselection())
+        selected = self.get_selected_wildcard()
+        if selected:
             self.interface.input_text.insert(tk.INSERT, f"__{selected}__")
             self.on_text_change()
 
@@ -91,8 +192,48 @@ class InterfaceActions:
 
 
     def refresh_wildcards(self):
-        self.wildcard_manager.reload_wildcards()
-        self.update_wildcards_list()
+        self.interface.parent.worker.submit_task(self.reload_wildcards, self.on_wildcards_reloaded)
+
+
+    def reload_wildcards(self):
+        """Runs on the worker thread. Returns (changed, reindexed)."""
+        changed, reindexed = self.wildcard_manager.reload_changed()
+        if changed:
+            self.interface.parent.segment_renderer.clear()
+        return changed, reindexed
+
+
+    def on_wildcards_reloaded(self, result):
+        self.apply_wildcard_changes(*result)
+
+
+    def apply_wildcard_changes(self, changed, reindexed):
+        """Update the list and live output after wildcard files changed on disk."""
+        if reindexed and self.interface.show_wildcards_var.get():
+            self.update_wildcards_list()
+        if changed and self.interface.live_var.get():
+            self.process_text_callback(live=True)
+
+
+    def toggle_wildcard_watcher(self):
+        watcher = self.interface.parent.watcher
+        if self.interface.watch_wildcards_var.get():
+            watcher.start()
+            if self.watch_after_id is None:
+                self.watch_after_id = self.interface.root.after(WATCH_POLL_MS, self.poll_wildcard_watcher)
+        else:
+            watcher.stop()
+
+
+    def poll_wildcard_watcher(self):
+        watcher = self.interface.parent.watcher
+        self.watch_after_id = None
+        if not watcher.running:
+            return
+        changed, reindexed = watcher.get_changes()
+        if changed or reindexed:
+            self.apply_wildcard_changes(changed, reindexed)
+        self.watch_after_id = self.interface.root.after(WATCH_POLL_MS, self.poll_wildcard_watcher)
 
 
     def estimate_token_count(self, text):
@@ -108,11 +249,25 @@ class InterfaceActions:
         return max(1, token_count)
 
 
+    def format_combination_count(self, count):
+        if count < 10**12:
+            return f"{count:,}"
+        digits = str(count)
+        return f"{digits[0]}.{digits[1:3]}e{len(digits) - 1}"
+
+
+    def set_combination_count(self, count):
+        self.combination_count = count
+
+
     def calculate_text_stats(self, text):
         char_count = len(text)
         word_count = len(text.split())
         token_count = self.estimate_token_count(text)
-        return f"Characters: {char_count} | Words: {word_count} | Tokens: ~{token_count}"
+        stats = f"Characters: {char_count} | Words: {word_count} | Tokens: ~{token_count}"
+        if self.combination_count is not None:
+            stats += f" | Combinations: {self.format_combination_count(self.combination_count)}"
+        return stats
 
 
     def update_stats_bar(self, text=None):
@@ -129,6 +284,36 @@ class InterfaceActions:
             self.update_stats_bar()
 
 
+    def toggle_instrumentation(self):
+        if self.interface.instrumentation_var.get():
+            self.instrumentation.enable()
+        else:
+            self.instrumentation.disable()
+        self.update_debug_panel()
+
+
+    def reset_instrumentation(self):
+        self.instrumentation.reset()
+        self.update_debug_panel()
+
+
+    def update_debug_panel(self):
+        tree = self.interface.debug_tree
+        tree.delete(*tree.get_children())
+        for label, counter in sorted(self.instrumentation.snapshot().items(), key=lambda item: -item[1]["own_ms"]):
+            tree.insert("", "end", text=label, values=(counter["calls"], f"{counter['total_ms']:.1f}", f"{counter['own_ms']:.1f}"))
+
+
+    def save_instrumentation(self):
+        path = filedialog.asksaveasfilename(title="Save Instrumentation", defaultextension=".json", filetypes=[("JSON", "*.json")], initialfile="instrumentation.json")
+        if not path:
+            return
+        try:
+            self.instrumentation.dump(path)
+        except Exception as e:
+            print(f"ERROR - save_instrumentation(): {e}", file=sys.stderr)
+
+
     def update_save_button_state(self):
         if self.interface.input_text.get("1.0", "end").strip():
             self.interface.save_prompt_button.configure(state="normal")
@@ -168,7 +353,7 @@ class InterfaceActions:
             with open(self.json_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"Error loading JSON file: {e}")
+            print(f"Error loading JSON file: {e}", file=sys.stderr)
             return {}
 
     def save_json(self, data):
@@ -176,7 +361,7 @@ class InterfaceActions:
             with open(self.json_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2)
         except Exception as e:
-            print(f"Error saving JSON file: {e}")
+            print(f"Error saving JSON file: {e}", file=sys.stderr)
 
 
     def get_json_folders_dict(self, include_children=False):
@@ -241,7 +426,7 @@ class InterfaceActions:
             else:
                 return sorted(collect_items_from_path(items, folder_path), key=str.lower)
         except Exception as e:
-            print(f"Error getting prompts from folder: {e}")
+            print(f"Error getting prompts from folder: {e}", file=sys.stderr)
             return []
 
 
@@ -282,7 +467,7 @@ class InterfaceActions:
             for prompt in prompts:
                 self.interface.saved_prompts_listbox.insert(tk.END, prompt)
         except Exception as e:
-            print(f"Error populating saved prompts list: {e}")
+            print(f"Error populating saved prompts list: {e}", file=sys.stderr)
 
 
     def on_prompt_select(self, event=None):
@@ -310,7 +495,7 @@ class InterfaceActions:
             # Reapply current filters
             self.filter_saved_prompts()
         except Exception as e:
-            print(f"Error refreshing JSON data: {e}")
+            print(f"Error refreshing JSON data: {e}", file=sys.stderr)
 
 
     def _find_folder_in_json(self, items, folder_id):
@@ -401,7 +586,7 @@ class InterfaceActions:
             self.save_json(data)
             return new_id
         except Exception as e:
-            print(f"Error saving prompt to folder: {str(e)}")
+            print(f"Error saving prompt to folder: {str(e)}", file=sys.stderr)
             return None
 
     def on_save_prompt(self):
@@ -6,6 +6,11 @@ import random
 # Local Imports
 from tester.wildcard_manager import WildcardManager
 from tester.processor import TextProcessor
+from tester.template import TemplateSyntaxError
+from tester.instrumentation import Instrumentation
+from tester.incremental import SegmentRenderer
+from tester.render_worker import RenderWorker
+from tester.wildcard_watcher import WildcardWatcher
 from tester.interface import Interface
 
 
@@ -14,16 +19,57 @@ class PromptTester:
     def __init__(self, root, tab):
         self.wildcard_manager = WildcardManager()
         self.processor = TextProcessor(self.wildcard_manager)
+        self.instrumentation = Instrumentation()
+        self.worker = RenderWorker(root)
+        self.segment_renderer = SegmentRenderer(self.processor)
+        self.watcher = WildcardWatcher(self.wildcard_manager, self.worker.lock, self.segment_renderer.clear)
+        self.seed = None
         self.ui = Interface(root, self, tab)
+        self.setup_instrumentation()
 
-    def set_random_seed(self):
+    def setup_instrumentation(self):
+        self.instrumentation.add(self.wildcard_manager, 'load_wildcard')
+        for method_name in ('process', 'compile', 'render_variant', 'render_wildcard', 'count_expansions'):
+            self.instrumentation.add(self.processor, method_name)
+        self.instrumentation.add(self.ui.actions, 'display_text_output')
+        self.instrumentation.add(self.ui.actions, 'display_segments')
+        self.instrumentation.add(self.ui.actions, 'calculate_text_stats')
+
+    def get_seed(self, live=False):
+        """Return the base seed. Live edits keep the current one so unchanged lines keep their output."""
         if self.ui.is_fixed_seed():
-            random.seed(42)
-        else:
-            random.seed()
-
-    def process_text(self):
-        text = self.ui.actions.get_input_text()
-        self.set_random_seed()
-        processed_text = self.processor.process(text)
-        self.ui.actions.display_text_output(processed_text)
+            return 42
+        if not live or self.seed is None:
+            self.seed = random.getrandbits(64)
+        return self.seed
+
+    def process_text(self, live=False):
+        """Queue the input text for rendering on the background worker."""
+        text = self.ui.actions.get_raw_input_text()
+        self.worker.submit(self.render_text, self.display_result, text, self.get_seed(live))
+
+    def render_text(self, text, seed):
+        """Runs on the worker thread. Returns (error, rendered segments, combination count)."""
+        try:
+            result = self.segment_renderer.render(text, seed, self.worker.cancelled)
+        except TemplateSyntaxError as e:
+            return e, None, None
+        except RecursionError:
+            # Only reachable through long chains of wildcards with deeply nested lines
+            return "Wildcards nested too deeply", None, None
+        if result is None:
+            return None
+        segments, combination_count = result
+        return None, segments, combination_count
+
+    def display_result(self, result):
+        if result is None:
+            return
+        error, segments, combination_count = result
+        if error is not None:
+            self.ui.actions.display_error(error)
+            return
+        self.ui.actions.set_combination_count(combination_count)
+        self.ui.actions.display_segments(segments)
+        if self.instrumentation.enabled:
+            self.ui.actions.update_debug_panel()
@@ -0,0 +1,228 @@
+"""Memory-mapped wildcard files with a persisted line offset index, for very large wildcards."""
+
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'WCIX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sIQqQB')
+INDEX_CHUNK_SIZE = 16 * 1024 * 1024
+FLAG_WEIGHTED = 1
+FLAG_DYNAMIC = 2
+
+WEIGHT_PATTERN = re.compile(r'(\d+(?:\.\d*)?|\.\d+)::')
+WEIGHT_BYTES_PATTERN = re.compile(rb'\s*(\d+(?:\.\d*)?|\.\d+)::')
+DYNAMIC_BYTES_PATTERN = re.compile(rb'\{|__')
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def to_little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+#endregion
+##################################################
+#region MappedWildcard
+class MappedWildcard:
+    """Read-only sequence of the lines of a memory-mapped wildcard file, decoded when accessed.
+
+    Line offsets are saved beside the file (`name.txt.idx`) and reused while its size and mtime match.
+    After close(), reading a line maps the file again.
+    """
+    def __init__(self, path, file, mapped, size, mtime_ns, starts, ends, weights, has_dynamic_lines):
+        self.path = path
+        self.file = file
+        self.map = mapped
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.starts = starts
+        self.ends = ends
+        self.weights = weights
+        self.has_dynamic_lines = has_dynamic_lines
+        self.dynamic_indices = None
+
+
+    @classmethod
+    def open(cls, path):
+        file = open(path, 'rb')
+        try:
+            stat = os.fstat(file.fileno())
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            index = cls.read_index(path, size, mtime_ns)
+            if index is None:
+                index = cls.build_index(mapped, size)
+                cls.write_index(path, size, mtime_ns, *index)
+        except Exception:
+            file.close()
+            raise
+        return cls(path, file, mapped, size, mtime_ns, *index)
+
+
+    @staticmethod
+    def build_index(mapped, size):
+        """Scan the file once, in chunks, and return (starts, ends, weights, has_dynamic_lines)."""
+        starts = array('Q')
+        ends = array('Q')
+        weights = array('d')
+        check_weights = mapped.find(b'::') != -1
+        weighted = False
+        offset = 0
+        while offset < size:
+            end = min(offset + INDEX_CHUNK_SIZE, size)
+            if end < size:
+                # Extend the chunk to the end of its last line
+                newline = mapped.find(b'\n', end)
+                end = size if newline == -1 else newline + 1
+            position = offset
+            for line in mapped[offset:end].split(b'\n'):
+                if line and line[0] != 35 and not line.isspace():
+                    starts.append(position)
+                    ends.append(position + len(line))
+                    if check_weights:
+                        match = WEIGHT_BYTES_PATTERN.match(line)
+                        weighted = weighted or match is not None
+                        weights.append(float(match.group(1)) if match else 1.0)
+                position += len(line) + 1
+            offset = end
+        has_dynamic_lines = mapped.find(b'{') != -1 or mapped.find(b'__') != -1
+        return starts, ends, (weights if weighted else None), has_dynamic_lines
+
+
+    @staticmethod
+    def read_index(path, size, mtime_ns):
+        """Return the saved index if it matches the file's current size and mtime, else None."""
+        try:
+            with open(index_path(path), 'rb') as file:
+                header = file.read(INDEX_HEADER.size)
+                if len(header) != INDEX_HEADER.size:
+                    return None
+                magic, version, index_size, index_mtime_ns, count, flags = INDEX_HEADER.unpack(header)
+                if magic != INDEX_MAGIC or version != INDEX_VERSION or index_size != size or index_mtime_ns != mtime_ns:
+                    return None
+                starts = from_little_endian('Q', file.read(count * 8))
+                ends = from_little_endian('Q', file.read(count * 8))
+                weights = from_little_endian('d', file.read(count * 8)) if flags & FLAG_WEIGHTED else None
+        except (OSError, ValueError):
+            return None
+        if len(starts) != count or len(ends) != count or (weights is not None and len(weights) != count):
+            return None
+        return starts, ends, weights, bool(flags & FLAG_DYNAMIC)
+
+
+    @staticmethod
+    def write_index(path, size, mtime_ns, starts, ends, weights, has_dynamic_lines):
+        flags = (FLAG_WEIGHTED if weights is not None else 0) | (FLAG_DYNAMIC if has_dynamic_lines else 0)
+        temporary_path = index_path(path) + '.tmp'
+        try:
+            with open(temporary_path, 'wb') as file:
+                file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, size, mtime_ns, len(starts), flags))
+                file.write(to_little_endian(starts))
+                file.write(to_little_endian(ends))
+                if weights is not None:
+                    file.write(to_little_endian(weights))
+            os.replace(temporary_path, index_path(path))
+        except OSError as e:
+            # A read-only folder only costs a rescan next time
+            print(f"ERROR - MappedWildcard.write_index(): {e}", file=sys.stderr)
+
+
+    def mapping(self):
+        if self.map is None:
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(self.file.fileno()).st_size else b''
+        return self.map
+
+
+    def decode(self, index):
+        line = self.mapping()[self.starts[index]:self.ends[index]].decode('utf-8', errors='replace').strip()
+        if self.weights is not None:
+            match = WEIGHT_PATTERN.match(line)
+            if match:
+                line = line[match.end():].strip()
+        return line
+
+
+    def dynamic_line_indices(self):
+        """Return the indices of lines containing `{` or `__`, found without decoding every line."""
+        if self.dynamic_indices is None:
+            indices = array('Q')
+            if self.has_dynamic_lines:
+                mapped = self.mapping()
+                starts, ends = self.starts, self.ends
+                position = 0
+                while True:
+                    match = DYNAMIC_BYTES_PATTERN.search(mapped, position)
+                    if match is None:
+                        break
+                    index = bisect_right(starts, match.start()) - 1
+                    if index >= 0 and match.start() < ends[index]:
+                        indices.append(index)
+                        position = ends[index]
+                    else:
+                        # Inside a skipped comment line
+                        position = match.start() + 1
+            self.dynamic_indices = indices
+        return self.dynamic_indices
+
+
+    def __len__(self):
+        return len(self.starts)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.decode(position) for position in range(*index.indices(len(self.starts)))]
+        if index < 0:
+            index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError("wildcard line index out of range")
+        return self.decode(index)
+
+
+    def __iter__(self):
+        for index in range(len(self.starts)):
+            yield self.decode(index)
+
+
+    def __reduce__(self):
+        # Worker processes reopen the file, reusing the saved index
+        return MappedWildcard.open, (self.path,)
+
+
+    @property
+    def index_bytes(self):
+        """Memory held by the offset index."""
+        total = self.starts.itemsize * len(self.starts) + self.ends.itemsize * len(self.ends)
+        if self.weights is not None:
+            total += self.weights.itemsize * len(self.weights)
+        return total
+
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        if self.file is not None:
+            self.file.close()
+        self.map = self.file = None
@@ -0,0 +1,64 @@
+"""Compact storage for the options of large wildcards."""
+
+import sys
+from array import array
+
+
+class OptionStore:
+    """Read-only sequence of strings kept newline-terminated in a single UTF-8 buffer.
+
+    Option `i` is `buffer[offsets[i]:offsets[i + 1] - 1]`, decoded when accessed, which costs
+    its encoded length plus 5 bytes instead of a str object and a list slot.
+    """
+    __slots__ = ('buffer', 'offsets', 'has_dynamic_lines')
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+        # Conservative: text split across two lines may match, never the reverse
+        self.has_dynamic_lines = b'{' in buffer or b'__' in buffer
+
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Build a store from an iterable of strings without holding them all at once."""
+        buffer = bytearray()
+        offsets = array('Q', [0])
+        for line in lines:
+            buffer += line.encode('utf-8')
+            buffer += b'\n'
+            offsets.append(len(buffer))
+        if len(buffer) < 2**32:
+            offsets = array('I', offsets)
+        return cls(bytes(buffer), offsets)
+
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self.offsets) - 1
+        if not 0 <= index < len(self.offsets) - 1:
+            raise IndexError("option index out of range")
+        return self.buffer[self.offsets[index]:self.offsets[index + 1] - 1].decode('utf-8')
+
+
+    def __iter__(self):
+        buffer = self.buffer
+        offsets = self.offsets
+        for index in range(len(offsets) - 1):
+            yield buffer[offsets[index]:offsets[index + 1] - 1].decode('utf-8')
+
+
+    def tolist(self):
+        return self.buffer.decode('utf-8').split('\n')[:-1]
+
+
+    @property
+    def nbytes(self):
+        """Memory held by the buffer and offsets."""
+        return sys.getsizeof(self.buffer) + self.offsets.itemsize * len(self.offsets)
@@ -0,0 +1,132 @@
+"""Parallel batch generation across a pool of worker processes."""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from tester.combinatorics import dynamic_lines, has_dynamic_lines
+from tester.processor import TextProcessor
+from tester.template import VariantNode, WildcardNode
+
+
+CHUNK_SIZE = 1000
+
+
+#endregion
+##################################################
+#region Wildcards
+class StaticWildcards:
+    """Read-only wildcard options shipped to a worker process, in place of a WildcardManager."""
+    def __init__(self, wildcards, weights):
+        self.wildcards = wildcards
+        self.weights = weights
+
+
+    def get_wildcard_options(self, wildcard_name):
+        return self.wildcards.get(wildcard_name)
+
+
+    def get_wildcard_weights(self, wildcard_name):
+        return self.weights.get(wildcard_name)
+
+
+    def get_wildcard_generation(self, wildcard_name):
+        return 0
+
+
+    def add_drop_callback(self, callback):
+        pass
+
+
+def iter_nodes(parts):
+    for part in parts:
+        if part.__class__ is str:
+            continue
+        yield part
+        if part.__class__ is VariantNode:
+            for option in part.options:
+                yield from iter_nodes(option)
+
+
+def collect_wildcards(processor, template):
+    """Return the options of every wildcard the template uses, directly or through wildcard lines."""
+    wildcards = {}
+    pending = [template.parts]
+    while pending:
+        for node in iter_nodes(pending.pop()):
+            if node.__class__ is not WildcardNode or node.name in wildcards:
+                continue
+            options = wildcards[node.name] = processor.wildcard_manager.get_wildcard_options(node.name)
+            if not options or not has_dynamic_lines(options):
+                continue
+            for line in dynamic_lines(options):
+                pending.append(processor.get_line_parts(node.name, options, line))
+    return wildcards
+
+
+def is_stateless(processor, template, wildcards):
+    """True when every choice is drawn by the random sampler, so prompts can be rendered in any process."""
+    random_sampler = processor.random_sampler
+    node_lists = [iter_nodes(template.parts)]
+    for wildcard_name, options in wildcards.items():
+        if not options or not has_dynamic_lines(options):
+            continue
+        for line in dynamic_lines(options):
+            node_lists.append(iter_nodes(processor.get_line_parts(wildcard_name, options, line)))
+    for nodes in node_lists:
+        for node in nodes:
+            if node.__class__ is VariantNode and node.is_multiple:
+                continue
+            if processor.get_sampler(node.prefix) is not random_sampler:
+                return False
+    return True
+
+
+#endregion
+##################################################
+#region Workers
+_worker_state = None
+
+
+def initialize_worker(template, wildcards, weights, seed):
+    global _worker_state
+    processor = TextProcessor(StaticWildcards(wildcards, weights))
+    processor.template_cache.put(template.text, template)
+    _worker_state = processor, template.text, seed
+
+
+def render_chunk(start, count):
+    processor, text, seed = _worker_state
+    return list(processor.process_batch(text, count, seed, start))
+
+
+#endregion
+##################################################
+#region Batch
+def parallel_batch(processor, text, count, seed=None, workers=None, chunk_size=CHUNK_SIZE, start=0):
+    """Yield `count` prompts from `text`, rendered across a process pool.
+
+    Output matches processor.process_batch() with the same seed and `start`. Templates that use
+    cyclical or combinatorial samplers fall back to the serial batch.
+    """
+    if seed is None:
+        seed = processor.rng.getrandbits(64)
+    template = processor.compile(text)
+    wildcards = collect_wildcards(processor, template)
+    weights = {wildcard_name: processor.wildcard_manager.get_wildcard_weights(wildcard_name) for wildcard_name in wildcards}
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or count <= chunk_size or not is_stateless(processor, template, wildcards):
+        yield from processor.process_batch(text, count, seed, start)
+        return
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker, initargs=(template, wildcards, weights, seed))
+    try:
+        pending = deque()
+        for offset in range(0, count, chunk_size):
+            pending.append(executor.submit(render_chunk, start + offset, min(chunk_size, count - offset)))
+            # Keep a bounded number of chunks in flight so memory stays flat
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -1,96 +1,153 @@
-"""TextProcessor class for processing text with wildcards and variants."""
+"""TextProcessor class for compiling and rendering text with wildcards and variants."""
 
 import random
-import re
+import sys
+import weakref
+from collections import OrderedDict
+
+from tester.alias_table import AliasTable
+from tester.combinatorics import Cardinality, Enumerator, ExpansionSpace
+from tester.dedupe import ERROR_RATE, EXACT_LIMIT, SeenSet
+from tester.template import MAX_WILDCARD_DEPTH, Template, TemplateCache, TemplateSyntaxError, VariantNode, is_dynamic, parse_template
+
+
+SAMPLER_STATE_SIZE = 4096
+MAX_REPEATS = 10_000
 
 
 #endregion
 ##################################################
 #region Samplers
+class SamplerState:
+    """Bounded LRU of sampler positions, keyed by variant node identity or wildcard name."""
+    def __init__(self, maxsize=SAMPLER_STATE_SIZE):
+        self.maxsize = maxsize
+        self.positions = OrderedDict()
+
+
+    def get(self, key):
+        position = self.positions.get(key)
+        if position is not None:
+            self.positions.move_to_end(key)
+        return position
+
+
+    def set(self, key, position):
+        self.positions[key] = position
+        self.positions.move_to_end(key)
+        if len(self.positions) > self.maxsize:
+            self.positions.popitem(last=False)
+
+
+    def reset(self):
+        self.positions.clear()
+
+
+    def __len__(self):
+        return len(self.positions)
+
+
 class BaseSampler:
-    def sample(self, options):
+    def sample(self, options, key):
         raise NotImplementedError()
 
 
+    def reset(self):
+        pass
+
+
 class RandomSampler(BaseSampler):
-    def sample(self, options):
-        return random.choice(options)
+    def __init__(self, rng):
+        self.rng = rng
+
+
+    def sample(self, options, key):
+        return self.rng.choice(options)
 
 
 class CyclicalSampler(BaseSampler):
     def __init__(self):
-        self.indices = {}
+        self.state = SamplerState()
 
 
-    def sample(self, options):
-        key = tuple(options)
-        if key not in self.indices:
-            self.indices[key] = 0
-        else:
-            self.indices[key] = (self.indices[key] + 1) % len(options)
-        return options[self.indices[key]]
+    def sample(self, options, key):
+        position = self.state.get(key)
+        position = 0 if position is None else (position + 1) % len(options)
+        self.state.set(key, position)
+        return options[position]
+
+
+    def reset(self):
+        self.state.reset()
 
 
 class CombinatorialSampler(BaseSampler):
     def __init__(self):
-        self.combinations = {}
-        self.indices = {}
+        self.state = SamplerState()
 
 
-    def sample(self, options):
-        key = tuple(options)
-        if key not in self.combinations:
-            self.combinations[key] = list(options)
-            self.indices[key] = 0
-        if self.indices[key] >= len(self.combinations[key]):
+    def sample(self, options, key):
+        position = self.state.get(key) or 0
+        if position >= len(options):
             return None
-        result = self.combinations[key][self.indices[key]]
-        self.indices[key] += 1
-        return result
+        self.state.set(key, position + 1)
+        return options[position]
+
+
+    def reset(self):
+        self.state.reset()
+
+
+#endregion
+##################################################
+#region Seeds
+MASK64 = (1 << 64) - 1
+
+
+def prompt_seed(seed, index):
+    """Derive the seed of prompt `index` in a batch seeded with `seed`, mixed with SplitMix64."""
+    value = ((seed & MASK64) + (index + 1) * 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+#endregion
+##################################################
+#region RenderContext
+class RenderContext:
+    """State shared by the prompts of one call; `stack` holds the wildcards being expanded."""
+    __slots__ = ('wildcard_manager', 'wildcards', 'stack')
+
+    def __init__(self, wildcard_manager):
+        self.wildcard_manager = wildcard_manager
+        self.wildcards = {}
+        self.stack = []
+
+
+    def get_wildcard_options(self, wildcard_name):
+        try:
+            return self.wildcards[wildcard_name]
+        except KeyError:
+            options = self.wildcards[wildcard_name] = self.wildcard_manager.get_wildcard_options(wildcard_name)
+            return options
 
 
 #endregion
 ##################################################
 #region TextProcessor
 class TextProcessor:
-    def __init__(self, wildcard_manager):
-        self.initialize_variant_regex()
-        self.initialize_wildcard_regex()
-        self.random_sampler = RandomSampler()
+    def __init__(self, wildcard_manager, seed=None):
+        self.rng = random.Random(seed)
+        self.random_sampler = RandomSampler(self.rng)
         self.cyclical_sampler = CyclicalSampler()
         self.combinatorial_sampler = CombinatorialSampler()
         self.default_sampler = self.random_sampler
         self.wildcard_manager = wildcard_manager
-
-
-    def initialize_variant_regex(self):
-        self.variant_pattern = re.compile(r'''
-            {                    # Opening brace
-            ([~@&])?             # Optional prefix (~, @, or &)
-            (?:                  # Start of count/separator group
-                (\d+(?:-\d+)?)   # Count (e.g., 2 or 1-3)
-                \$\$             # Double-dollar separator
-                (?:              # Start of optional separator
-                    ([^${}|]*)   # Separator content
-                    \$\$         # Double-dollar separator
-                )?               # End of optional separator
-            )?                   # End of count/separator group
-            ([^{}]*              # Content: non-brace chars
-            (?:{[^{}]*}[^{}]*)*  # Nested brace patterns
-            )                    # End of content group
-            }                    # Closing brace
-        ''', re.VERBOSE)
-
-
-    def initialize_wildcard_regex(self):
-        self.wildcard_pattern = re.compile(r'''
-            __              # Opening double-underscore
-            ([~@&])?        # Optional prefix (~, @, or &)
-            ([^_\s]+        # First part of wildcard name
-            (?:_[^_\s]+)*   # Allow additional parts with underscores
-            )               # End of wildcard name group
-            __              # Closing double-underscore
-        ''', re.VERBOSE)
+        self.template_cache = TemplateCache()
+        self.wildcard_lines = {}
+        self.wildcard_aliases = {}
+        wildcard_manager.add_drop_callback(weakref.WeakMethod(self.forget_wildcard))
 
 
     def get_sampler(self, prefix):
@@ -98,66 +155,205 @@ class TextProcessor:
             return self.random_sampler
         elif prefix == '@':
             return self.cyclical_sampler
-        elif prefix == '$':
+        elif prefix == '&':
             return self.combinatorial_sampler
         return self.default_sampler
 
 
-    def parse_selection_count(self, count_str):
-        if not count_str:
-            return 1, 1
-        if '-' in count_str:
-            min_count, max_count = map(int, count_str.split('-'))
-            return min_count or 1, max_count
-        return int(count_str), int(count_str)
-
-
-    def process_variant(self, match):
-        prefix = match.group(1)
-        count_str = match.group(2)
-        separator = match.group(3) or ', '
-        content = match.group(4)
-        if '{' in content:
-            content = self.variant_pattern.sub(self.process_variant, content)
-        options = []
-        current = []
-        brace_count = 0
-        for char in content:
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-            elif char == '|' and brace_count == 0:
-                options.append(''.join(current).strip())
-                current = []
-                continue
-            current.append(char)
-        options.append(''.join(current).strip())
-        sampler = self.get_sampler(prefix)
-        if count_str:
-            min_count, max_count = self.parse_selection_count(count_str)
-            count = random.randint(min_count, max_count)
+    def compile(self, text):
+        template = self.template_cache.get(text)
+        if template is None:
+            template = Template(text, parse_template(text))
+            self.template_cache.put(text, template)
+        return template
+
+
+    def forget_wildcard(self, wildcard_name):
+        """Called by the wildcard manager when it drops a wildcard."""
+        self.wildcard_lines.pop(wildcard_name, None)
+        self.wildcard_aliases.pop(wildcard_name, None)
+
+
+    def get_line_parts(self, wildcard_name, options, line):
+        """Return the parsed parts of a wildcard line, parsed once per load of the wildcard."""
+        generation = self.wildcard_manager.get_wildcard_generation(wildcard_name)
+        entry = self.wildcard_lines.get(wildcard_name)
+        if entry is None or entry[0] != generation:
+            entry = (generation, {})
+            # Options a render still holds after the manager dropped them are parsed without caching
+            if generation is not None:
+                self.wildcard_lines[wildcard_name] = entry
+        lines = entry[1]
+        parts = lines.get(line)
+        if parts is None:
+            try:
+                parts = parse_template(line)
+            except TemplateSyntaxError as e:
+                print(f"ERROR - __{wildcard_name}__: {e}", file=sys.stderr)
+                parts = (line,)
+            lines[line] = parts
+        return parts
+
+
+    def get_wildcard_alias(self, wildcard_name, options):
+        """Return the alias table of a weighted wildcard, built once per load, or None."""
+        weights = self.wildcard_manager.get_wildcard_weights(wildcard_name)
+        if not weights:
+            return None
+        generation = self.wildcard_manager.get_wildcard_generation(wildcard_name)
+        entry = self.wildcard_aliases.get(wildcard_name)
+        if entry is None or entry[0] != generation:
+            entry = (generation, AliasTable(weights))
+            if generation is not None:
+                self.wildcard_aliases[wildcard_name] = entry
+        return entry[1]
+
+
+    def render_parts(self, parts, out, context):
+        for part in parts:
+            if part.__class__ is str:
+                out.append(part)
+            elif part.__class__ is VariantNode:
+                self.render_variant(part, out, context)
+            else:
+                self.render_wildcard(part, out, context)
+
+
+    def render_option(self, option, context):
+        out = []
+        self.render_parts(option, out, context)
+        return ''.join(out)
+
+
+    def render_variant(self, node, out, context):
+        options = node.options
+        if node.is_multiple:
+            count = self.rng.randint(node.min_count, node.max_count)
             count = min(count, len(options))
-            selected = random.sample(options, count)
-            return separator.join(selected)
-        result = sampler.sample(options)
-        return result if result is not None else options[0]
-
-
-    def process_wildcard(self, match):
-        prefix = match.group(1)
-        wildcard_name = match.group(2)
-        options = self.wildcard_manager.get_wildcard_options(wildcard_name)
-        if not options:
-            return f"__{wildcard_name}__"
-        sampler = self.get_sampler(prefix)
-        result = sampler.sample(options)
-        return result if result is not None else options[0]
-
-
-    def process(self, text):
-        text = self.wildcard_pattern.sub(self.process_wildcard, text)
-        return self.variant_pattern.sub(self.process_variant, text)
+            selected = self.rng.sample(options, count)
+            out.append(node.separator.join(self.render_option(option, context) for option in selected))
+            return
+        sampler = self.get_sampler(node.prefix)
+        if node.alias is not None and sampler is self.random_sampler:
+            result = options[node.alias.sample(self.rng)]
+        else:
+            result = sampler.sample(options, node)
+        self.render_parts(result if result is not None else options[0], out, context)
+
+
+    def render_wildcard(self, node, out, context):
+        wildcard_name = node.name
+        options = context.get_wildcard_options(wildcard_name)
+        stack = context.stack
+        # Missing wildcards, cycles and references past the depth limit are left as written
+        if not options or wildcard_name in stack or len(stack) >= MAX_WILDCARD_DEPTH:
+            out.append(f"__{wildcard_name}__")
+            return
+        sampler = self.get_sampler(node.prefix)
+        alias = self.get_wildcard_alias(wildcard_name, options) if sampler is self.random_sampler else None
+        if alias is not None:
+            result = options[alias.sample(self.rng)]
+        else:
+            result = sampler.sample(options, wildcard_name)
+        if result is None:
+            result = options[0]
+        if not is_dynamic(result):
+            out.append(result)
+            return
+        stack.append(wildcard_name)
+        self.render_parts(self.get_line_parts(wildcard_name, options, result), out, context)
+        stack.pop()
+
+
+    def render(self, template, context):
+        out = []
+        self.render_parts(template.parts, out, context)
+        return ''.join(out)
+
+
+    def set_seed(self, seed=None):
+        """Reseed this processor's RNG. None seeds from system entropy."""
+        self.rng.seed(seed)
+
+
+    def process(self, text, seed=None):
+        if seed is not None:
+            self.rng.seed(seed)
+        return self.render(self.compile(text), RenderContext(self.wildcard_manager))
+
+
+    def process_batch(self, text, count, seed=None, start=0, unique=False):
+        """Yield `count` prompts rendered from a single compile of `text`.
+
+        Prompt `index` is drawn from prompt_seed(seed, index), so process_prompt() reproduces it.
+        With `unique`, repeated prompts are skipped; see process_unique().
+        """
+        if unique:
+            for index, prompt in self.process_unique(text, count, seed, start):
+                yield prompt
+            return
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        template = self.compile(text)
+        context = RenderContext(self.wildcard_manager)
+        render = self.render
+        reseed = self.rng.seed
+        for index in range(start, start + count):
+            reseed(prompt_seed(seed, index))
+            yield render(template, context)
+
+
+    def process_unique(self, text, count, seed=None, start=0, exact_limit=EXACT_LIMIT, error_rate=ERROR_RATE, max_repeats=MAX_REPEATS):
+        """Yield (index, prompt) for up to `count` distinct prompts.
+
+        Repeats are found with a SeenSet. Stops early when no unseen expansions are left, or after
+        `max_repeats` repeats in a row.
+        """
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        template = self.compile(text)
+        limit = min(count, Cardinality(self, ordered=True).count(template))
+        seen = SeenSet(limit, exact_limit, error_rate)
+        context = RenderContext(self.wildcard_manager)
+        render = self.render
+        reseed = self.rng.seed
+        index = start
+        repeats = 0
+        while len(seen) < limit and repeats < max_repeats:
+            reseed(prompt_seed(seed, index))
+            prompt = render(template, context)
+            index += 1
+            if seen.add(prompt):
+                repeats = 0
+                yield index - 1, prompt
+            else:
+                repeats += 1
+
+
+    def process_prompt(self, text, seed, index):
+        """Return prompt `index` of the batch seeded with `seed`."""
+        return self.process(text, seed=prompt_seed(seed, index))
+
+
+    def iter_expansions(self, text):
+        """Lazily yield every distinct expansion of `text`, ignoring sampler prefixes."""
+        return Enumerator(self).expand(self.compile(text))
+
+
+    def count_expansions(self, text):
+        """Return the exact number of expansions of `text` without generating them."""
+        return Cardinality(self).count(self.compile(text))
+
+
+    def expansion_space(self, text):
+        """Return an ExpansionSpace for indexed or shuffled access to the expansions of `text`."""
+        return ExpansionSpace(self, self.compile(text))
+
+
+    def reset_samplers(self):
+        """Restart every cyclical and combinatorial sequence from its first option."""
+        self.cyclical_sampler.reset()
+        self.combinatorial_sampler.reset()
 
 
     def set_default_sampler(self, sampler_type):
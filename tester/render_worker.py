@@ -0,0 +1,124 @@
+"""Background thread that renders prompts off the Tk thread."""
+
+import queue
+import sys
+import threading
+from collections import deque
+
+
+POLL_INTERVAL_MS = 15
+
+
+class RenderWorker:
+    """Runs one job at a time on a daemon thread, keeping only the newest request.
+
+    Results are handed back on the Tk thread by polling with root.after(). `lock` is held while
+    a job runs; take it before changing state the job reads, such as the loaded wildcards, or
+    make the change a task so the Tk thread does not wait for a render.
+    """
+    def __init__(self, root, poll_interval=POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.results = queue.SimpleQueue()
+        self.pending = None
+        self.tasks = deque()
+        self.task_count = 0
+        self.tasks_finished = 0
+        self.generation = 0
+        self.running = 0
+        self.finished = 0
+        self.polling = False
+        self.thread = threading.Thread(target=self.run, name="RenderWorker", daemon=True)
+        self.thread.start()
+
+
+    def submit(self, function, callback, *args):
+        """Run function(*args) in the background, then callback(result) on the Tk thread unless superseded."""
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, function, args, callback)
+            self.condition.notify()
+        self.start_polling()
+
+
+    def submit_task(self, function, callback, *args):
+        """Run function(*args) in the background before the next job, then callback(result) on the Tk thread.
+
+        Tasks run in order and are never superseded.
+        """
+        with self.condition:
+            self.task_count += 1
+            self.tasks.append((function, args, callback))
+            self.condition.notify()
+        self.start_polling()
+
+
+    def cancelled(self):
+        """True when the running job has been superseded. Call from inside a job."""
+        return self.running != self.generation
+
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.tasks:
+                    self.condition.wait()
+                if self.tasks:
+                    function, args, callback = self.tasks.popleft()
+                    generation = None
+                else:
+                    generation, function, args, callback = self.pending
+                    self.pending = None
+            if generation is None:
+                self.run_task(function, args, callback)
+                continue
+            self.running = generation
+            with self.lock:
+                try:
+                    result = function(*args)
+                except Exception as e:
+                    print(f"ERROR - RenderWorker: {e}", file=sys.stderr)
+                else:
+                    self.results.put((generation, callback, result))
+            self.finished = generation
+
+
+    def run_task(self, function, args, callback):
+        with self.lock:
+            try:
+                result = function(*args)
+            except Exception as e:
+                print(f"ERROR - RenderWorker: {e}", file=sys.stderr)
+            else:
+                self.results.put((None, callback, result))
+        self.tasks_finished += 1
+
+
+    def start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self.poll)
+
+
+    def poll(self):
+        # Read before draining: a job's result is queued before it is marked finished
+        done = self.finished >= self.generation and self.tasks_finished >= self.task_count
+        latest = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result[0] is None:
+                result[1](result[2])
+            else:
+                latest = result
+        if latest is not None and latest[0] == self.generation:
+            generation, callback, result = latest
+            callback(result)
+        if done:
+            self.polling = False
+        else:
+            self.root.after(self.poll_interval, self.poll)
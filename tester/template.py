@@ -0,0 +1,280 @@
+"""Compiled template structures and the cache used by the TextProcessor."""
+
+import re
+from collections import OrderedDict
+
+from tester.alias_table import AliasTable
+
+
+TEMPLATE_CACHE_SIZE = 256
+MAX_WILDCARD_DEPTH = 16
+MAX_NESTING_DEPTH = 100
+SAMPLER_PREFIXES = '~@&'
+DEFAULT_SEPARATOR = ', '
+
+SPECIAL_PATTERN = re.compile(r'[{}|_]')
+COUNT_PATTERN = re.compile(r'(\d+(?:-\d+)?)\$\$')
+SEPARATOR_PATTERN = re.compile(r'([^${}|]*)\$\$')
+NAME_PATTERN = re.compile(r'[^_\s{}|]+')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+WEIGHT_PATTERN = re.compile(r'\s*(\d+(?:\.\d*)?|\.\d+)::')
+
+
+class TemplateSyntaxError(ValueError):
+    """Raised for unbalanced braces. `position` is the offset of the offending brace."""
+    def __init__(self, message, text, position):
+        self.position = position
+        self.line = text.count('\n', 0, position) + 1
+        self.column = position - text.rfind('\n', 0, position)
+        super().__init__(f"{message} at line {self.line}, column {self.column}")
+
+
+#endregion
+##################################################
+#region Nodes
+class VariantNode:
+    """A `{...}` block. Each option is a tuple of parts; `alias` is only set when options are weighted."""
+    __slots__ = ('prefix', 'min_count', 'max_count', 'separator', 'options', 'weights', 'alias')
+
+    def __init__(self, prefix, min_count, max_count, separator, options, weights=None):
+        self.prefix = prefix
+        self.min_count = min_count
+        self.max_count = max_count
+        self.separator = separator
+        self.options = options
+        self.weights = weights
+        self.alias = AliasTable(weights) if weights is not None else None
+
+
+    @property
+    def is_multiple(self):
+        return self.min_count is not None
+
+
+class WildcardNode:
+    """A `__name__` reference to a wildcard file."""
+    __slots__ = ('prefix', 'name')
+
+    def __init__(self, prefix, name):
+        self.prefix = prefix
+        self.name = name
+
+
+    @property
+    def text(self):
+        return f"__{self.prefix or ''}{self.name}__"
+
+
+class Template:
+    """A parsed template: the source text and its top-level parts."""
+    __slots__ = ('text', 'parts')
+
+    def __init__(self, text, parts):
+        self.text = text
+        self.parts = parts
+
+
+#endregion
+##################################################
+#region Parser
+def parse_selection_count(count_str):
+    if '-' in count_str:
+        min_count, max_count = map(int, count_str.split('-'))
+        min_count = min_count or 1
+        return min_count, max(min_count, max_count)
+    return int(count_str), int(count_str)
+
+
+def parse_variant_header(text, position):
+    """Parse the optional prefix, `N$$` count and `sep$$` separator after a `{`."""
+    prefix = None
+    min_count = max_count = None
+    separator = DEFAULT_SEPARATOR
+    if position < len(text) and text[position] in SAMPLER_PREFIXES:
+        prefix = text[position]
+        position += 1
+    match = COUNT_PATTERN.match(text, position)
+    if match:
+        min_count, max_count = parse_selection_count(match.group(1))
+        position = match.end()
+        match = SEPARATOR_PATTERN.match(text, position)
+        if match:
+            separator = match.group(1)
+            position = match.end()
+    return prefix, min_count, max_count, separator, position
+
+
+def scan_wildcard(text, position):
+    """Match `__[prefix]name__` at position. Returns (node, end), or (None, position) if there is none."""
+    index = position + 2
+    prefix = None
+    if index < len(text) and text[index] in SAMPLER_PREFIXES:
+        prefix = text[index]
+        index += 1
+    name_start = index
+    while True:
+        match = NAME_PATTERN.match(text, index)
+        if not match:
+            return None, position
+        index = match.end()
+        if text.startswith('__', index):
+            return WildcardNode(prefix, text[name_start:index]), index + 2
+        if not text.startswith('_', index):
+            return None, position
+        index += 1
+
+
+def parse_weight(text, position, weights):
+    """Consume an optional `weight::` prefix at the start of an option."""
+    match = WEIGHT_PATTERN.match(text, position)
+    if match:
+        weights.append(float(match.group(1)))
+        return match.end()
+    weights.append(None)
+    return position
+
+
+def finish_weights(weights):
+    if all(weight is None for weight in weights):
+        return None
+    return tuple(1.0 if weight is None else weight for weight in weights)
+
+
+def finish_option(parts):
+    """Strip surrounding whitespace from an option, as the options of a variant are trimmed."""
+    if parts and parts[0].__class__ is str:
+        parts[0] = parts[0].lstrip()
+    if parts and parts[-1].__class__ is str:
+        parts[-1] = parts[-1].rstrip()
+    return tuple(part for part in parts if part != '')
+
+
+def parse_template(text):
+    """Parse template text into literal strings, VariantNodes and WildcardNodes in one pass.
+
+    Raises TemplateSyntaxError for unbalanced braces or nesting deeper than MAX_NESTING_DEPTH.
+    """
+    stack = []
+    parts = []
+    literal_start = 0
+    position = 0
+    search = SPECIAL_PATTERN.search
+    while True:
+        match = search(text, position)
+        if match is None:
+            break
+        position = match.start()
+        char = text[position]
+        if char == '_':
+            node, end = scan_wildcard(text, position) if text.startswith('__', position) else (None, position)
+            if node is None:
+                position += 1
+                continue
+            if literal_start < position:
+                parts.append(text[literal_start:position])
+            parts.append(node)
+            position = literal_start = end
+            continue
+        if char == '|' and not stack:
+            position += 1
+            continue
+        if literal_start < position:
+            parts.append(text[literal_start:position])
+        if char == '{':
+            if len(stack) >= MAX_NESTING_DEPTH:
+                raise TemplateSyntaxError(f"Variants nested deeper than {MAX_NESTING_DEPTH} levels", text, position)
+            prefix, min_count, max_count, separator, end = parse_variant_header(text, position + 1)
+            weights = []
+            end = parse_weight(text, end, weights)
+            stack.append((position, parts, [], weights, prefix, min_count, max_count, separator))
+            parts = []
+        elif char == '|':
+            stack[-1][2].append(finish_option(parts))
+            parts = []
+            end = parse_weight(text, position + 1, stack[-1][3])
+        else:
+            if not stack:
+                raise TemplateSyntaxError("Unexpected '}'", text, position)
+            _, parent_parts, options, weights, prefix, min_count, max_count, separator = stack.pop()
+            options.append(finish_option(parts))
+            parent_parts.append(VariantNode(prefix, min_count, max_count, separator, tuple(options), finish_weights(weights)))
+            parts = parent_parts
+            end = position + 1
+        position = literal_start = end
+    if stack:
+        raise TemplateSyntaxError("Unclosed '{'", text, stack[-1][0])
+    if literal_start < len(text):
+        parts.append(text[literal_start:])
+    return tuple(parts)
+
+
+def strip_comments(text):
+    """Drop lines starting with # and collapse runs of blank lines, as the Prompt Tester input does."""
+    lines = [line for line in text.strip().splitlines() if not line.strip().startswith('#')]
+    return BLANK_LINES_PATTERN.sub('\n\n', '\n'.join(lines))
+
+
+def split_segments(text):
+    """Split input into segments that render independently: one line, or several for a multi-line variant.
+
+    Joining them with newlines gives the same text as strip_comments().
+    """
+    segments = []
+    pending = []
+    depth = 0
+    blank = False
+    for line in text.strip().splitlines():
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            continue
+        if not stripped and not pending:
+            if not blank:
+                segments.append('')
+            blank = True
+            continue
+        blank = False
+        pending.append(line)
+        depth = max(0, depth + line.count('{') - line.count('}'))
+        if depth == 0:
+            segments.append('\n'.join(pending))
+            pending = []
+    if pending:
+        segments.append('\n'.join(pending))
+    return segments
+
+
+def is_dynamic(text):
+    """True when text may contain variants or wildcards and needs parsing."""
+    return '{' in text or '__' in text
+
+
+#endregion
+##################################################
+#region Cache
+class TemplateCache:
+    """Bounded LRU of compiled templates keyed by template text."""
+    def __init__(self, maxsize=TEMPLATE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.templates = OrderedDict()
+
+
+    def get(self, text):
+        template = self.templates.get(text)
+        if template is not None:
+            self.templates.move_to_end(text)
+        return template
+
+
+    def put(self, text, template):
+        self.templates[text] = template
+        self.templates.move_to_end(text)
+        while len(self.templates) > self.maxsize:
+            self.templates.popitem(last=False)
+
+
+    def clear(self):
+        self.templates.clear()
+
+
+    def __len__(self):
+        return len(self.templates)
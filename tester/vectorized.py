@@ -0,0 +1,235 @@
+"""Vectorized batch generation with NumPy, which is optional."""
+
+from tester.parallel import collect_wildcards, is_stateless
+from tester.template import MAX_WILDCARD_DEPTH, VariantNode, is_dynamic
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+VECTOR_CHUNK_SIZE = 100_000
+
+
+def object_array(values):
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def normalize(weights):
+    if not weights:
+        return None
+    total = sum(weights)
+    if total <= 0:
+        return None
+    return numpy.array(weights, dtype=float) / total
+
+
+#endregion
+##################################################
+#region OptionTable
+class OptionTable:
+    """The options of one choice point as arrays: literal text, dynamic flags and probabilities."""
+    __slots__ = ('literals', 'dynamic', 'probabilities')
+
+    def __init__(self, literals, dynamic, probabilities):
+        self.literals = object_array(literals)
+        self.dynamic = numpy.array(dynamic, dtype=bool) if any(dynamic) else None
+        self.probabilities = probabilities
+
+
+    def take(self, indices):
+        return self.literals[indices]
+
+
+class MappedOptionTable(OptionTable):
+    """The lines of a memory-mapped wildcard, decoding only the lines that are drawn."""
+    __slots__ = ('options',)
+
+    def __init__(self, options, dynamic_indices, probabilities):
+        self.options = options
+        self.literals = None
+        self.dynamic = None
+        if len(dynamic_indices):
+            self.dynamic = numpy.zeros(len(options), dtype=bool)
+            self.dynamic[numpy.frombuffer(dynamic_indices, dtype=numpy.uint64).astype(numpy.intp)] = True
+        self.probabilities = probabilities
+
+
+    def take(self, indices):
+        drawn, inverse = numpy.unique(indices, return_inverse=True)
+        options = self.options
+        return object_array([options[index] for index in drawn.tolist()])[inverse]
+
+
+def variant_table(node):
+    literals = []
+    dynamic = []
+    for option in node.options:
+        is_literal = all(part.__class__ is str for part in option)
+        literals.append(''.join(option) if is_literal else '')
+        dynamic.append(not is_literal)
+    return OptionTable(literals, dynamic, normalize(node.weights))
+
+
+def wildcard_table(options, weights):
+    line_indices = getattr(options, 'dynamic_line_indices', None)
+    if line_indices is not None:
+        return MappedOptionTable(options, line_indices(), normalize(weights))
+    dynamic = [is_dynamic(line) for line in options]
+    return OptionTable(options, dynamic, normalize(weights))
+
+
+#endregion
+##################################################
+#region VectorRenderer
+class VectorRenderer:
+    """Renders a batch of prompts column by column.
+
+    Each choice point draws the option of every prompt at once; options holding nested choices
+    are rendered once for the group of prompts that picked them.
+    """
+    def __init__(self, processor, wildcards, seed):
+        self.processor = processor
+        self.wildcards = wildcards
+        self.generator = numpy.random.default_rng(seed)
+        self.variant_tables = {}
+        self.wildcard_tables = {}
+
+
+    def render(self, template, size):
+        return self.render_parts(template.parts, size, ())
+
+
+    def render_parts(self, parts, size, path):
+        result = ''
+        for part in parts:
+            if part.__class__ is str:
+                result = result + part
+            elif part.__class__ is VariantNode:
+                result = result + self.render_variant(part, size, path)
+            else:
+                result = result + self.render_wildcard(part, size, path)
+        if result.__class__ is str:
+            return numpy.full(size, result, dtype=object)
+        return result
+
+
+    def draw(self, option_count, probabilities, size):
+        if probabilities is None:
+            return self.generator.integers(option_count, size=size)
+        return self.generator.choice(option_count, size=size, p=probabilities)
+
+
+    def choose(self, table, indices, render_dynamic):
+        """Return the text of option indices[i] for every prompt i."""
+        result = table.take(indices)
+        if table.dynamic is None:
+            return result
+        rows = numpy.flatnonzero(table.dynamic[indices])
+        if not len(rows):
+            return result
+        # Group the prompts by the dynamic option they picked
+        picked = indices[rows]
+        order = picked.argsort(kind='stable')
+        rows = rows[order]
+        starts = numpy.flatnonzero(numpy.diff(picked[order])) + 1
+        for group in numpy.split(rows, starts):
+            result[group] = render_dynamic(int(indices[group[0]]), len(group))
+        return result
+
+
+    def get_variant_table(self, node):
+        table = self.variant_tables.get(node)
+        if table is None:
+            table = self.variant_tables[node] = variant_table(node)
+        return table
+
+
+    def render_variant(self, node, size, path):
+        table = self.get_variant_table(node)
+        options = node.options
+        render_dynamic = lambda index, count: self.render_parts(options[index], count, path)
+        if node.is_multiple:
+            return self.render_multiple(node, table, size, render_dynamic)
+        return self.choose(table, self.draw(len(options), table.probabilities, size), render_dynamic)
+
+
+    def render_multiple(self, node, table, size, render_dynamic):
+        """Render an `N$$` selection: a random count, then distinct options in random order, unweighted."""
+        option_count = len(node.options)
+        counts = self.generator.integers(node.min_count, node.max_count + 1, size=size)
+        numpy.minimum(counts, option_count, out=counts)
+        result = numpy.full(size, '', dtype=object)
+        columns = []
+        for position in range(min(node.max_count, option_count)):
+            rows = numpy.flatnonzero(counts > position)
+            column = self.generator.integers(option_count, size=len(rows))
+            # Redraw until each prompt's picks are distinct
+            clashes = numpy.zeros(len(rows), dtype=bool)
+            for previous in columns:
+                clashes |= column == previous[rows]
+            while clashes.any():
+                redraw = numpy.flatnonzero(clashes)
+                column[redraw] = self.generator.integers(option_count, size=len(redraw))
+                clashes[:] = False
+                for previous in columns:
+                    clashes[redraw] |= column[redraw] == previous[rows[redraw]]
+            full_column = numpy.zeros(size, dtype=column.dtype)
+            full_column[rows] = column
+            columns.append(full_column)
+            text = self.choose(table, column, render_dynamic)
+            result[rows] = text if position == 0 else result[rows] + node.separator + text
+        return result
+
+
+    def get_wildcard_table(self, wildcard_name, options):
+        entry = self.wildcard_tables.get(wildcard_name)
+        if entry is None:
+            weights = self.processor.wildcard_manager.get_wildcard_weights(wildcard_name)
+            entry = self.wildcard_tables[wildcard_name] = wildcard_table(options, weights)
+        return entry
+
+
+    def render_wildcard(self, node, size, path):
+        wildcard_name = node.name
+        options = self.wildcards.get(wildcard_name)
+        # Missing wildcards, cycles and references past the depth limit are left as written
+        if not options or wildcard_name in path or len(path) >= MAX_WILDCARD_DEPTH:
+            return f"__{wildcard_name}__"
+        table = self.get_wildcard_table(wildcard_name, options)
+        line_path = path + (wildcard_name,)
+        get_line_parts = self.processor.get_line_parts
+        render_dynamic = lambda index, count: self.render_parts(get_line_parts(wildcard_name, options, options[index]), count, line_path)
+        return self.choose(table, self.draw(len(options), table.probabilities, size), render_dynamic)
+
+
+#endregion
+##################################################
+#region Batch
+def vectorized_batch(processor, text, count, seed=None, chunk_size=VECTOR_CHUNK_SIZE):
+    """Yield `count` prompts from `text`, drawing each chunk of the batch at once with NumPy.
+
+    Same distribution as processor.process_batch(), but different prompts for a given seed. Falls
+    back to process_batch() without NumPy or with cyclical or combinatorial samplers.
+    """
+    if seed is None:
+        seed = processor.rng.getrandbits(64)
+    if not can_vectorize(processor, text):
+        yield from processor.process_batch(text, count, seed)
+        return
+    template = processor.compile(text)
+    wildcards = collect_wildcards(processor, template)
+    renderer = VectorRenderer(processor, wildcards, seed)
+    for offset in range(0, count, chunk_size):
+        yield from renderer.render(template, min(chunk_size, count - offset)).tolist()
+
+
+def can_vectorize(processor, text):
+    """True if vectorized_batch() draws `text` with NumPy rather than falling back to process_batch()."""
+    if numpy is None:
+        return False
+    template = processor.compile(text)
+    return is_stateless(processor, template, collect_wildcards(processor, template))
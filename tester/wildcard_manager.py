@@ -2,27 +2,62 @@
 
 
 import os
+import re
+import sys
+from array import array
+from collections import OrderedDict
+
+from tester.compiled_cache import CompiledCache
+from tester.mapped_wildcard import MappedWildcard
+from tester.option_store import OptionStore
+
+
+WEIGHT_PATTERN = re.compile(r'(\d+(?:\.\d*)?|\.\d+)::')
+COMPACT_THRESHOLD = 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+COMPILED_CACHE_FILE = "wildcard_cache.bin"
 
 
 class WildcardManager:
-    def __init__(self):
+    """Indexes a folder of wildcard .txt files, including subfolders, and loads each on first use.
+
+    Large files are kept in an OptionStore (`compact_threshold`) or memory-mapped (`mmap_threshold`).
+    With `max_cache_bytes`, least recently used wildcards are evicted.
+    """
+    def __init__(self, remember_path=True, max_cache_bytes=None, mmap_threshold=MMAP_THRESHOLD, compact_threshold=COMPACT_THRESHOLD):
         self.wildcards_path = None
-        self.wildcard_cache = {}
+        self.wildcard_cache = OrderedDict()
+        self.wildcard_sizes = {}
+        self.wildcard_stats = {}
+        self.directory_stats = {}
+        self.cache_bytes = 0
+        self.max_cache_bytes = max_cache_bytes
+        self.mmap_threshold = mmap_threshold
+        self.compact_threshold = compact_threshold
+        self.wildcard_weights = {}
+        self.wildcard_generations = {}
+        self.load_generation = 0
+        self.drop_callbacks = []
+        self.wildcard_files = {}
         self.available_wildcards = set()
+        # The GUI remembers the last folder and parsed files between sessions; headless use should not touch them
+        self.remember_path = remember_path
         self.initialize_last_path_file()
-        self.load_last_path()
+        self.compiled_cache = CompiledCache(os.path.join(self.config_dir, COMPILED_CACHE_FILE)) if remember_path else None
+        if remember_path:
+            self.load_last_path()
 
 
     def initialize_last_path_file(self):
         script_dir = os.path.dirname(os.path.abspath(__file__))
         parent_dir = os.path.dirname(script_dir)
-        target_dir = os.path.join(parent_dir, 'config')
-        self.last_path_file = os.path.join(target_dir, "last_wildcard_path.txt")
+        self.config_dir = os.path.join(parent_dir, 'config')
+        self.last_path_file = os.path.join(self.config_dir, "last_wildcard_path.txt")
 
 
     def set_wildcards_path(self, path):
         self.wildcards_path = os.path.normpath(path)
-        if path:
+        if path and self.remember_path:
             self.save_last_path(path)
         self.load_wildcard_files()
 
@@ -32,7 +67,7 @@ class WildcardManager:
             with open(self.last_path_file, "w", encoding="utf-8") as file:
                 file.write(path)
         except Exception as e:
-            print(f"ERROR - save_last_path(): {e}")
+            print(f"ERROR - save_last_path(): {e}", file=sys.stderr)
 
 
     def load_last_path(self):
@@ -44,51 +79,296 @@ class WildcardManager:
                 if path and os.path.isdir(path):
                     self.set_wildcards_path(path)
         except Exception as e:
-            print(f"ERROR - load_last_path(): {e}")
+            print(f"ERROR - load_last_path(): {e}", file=sys.stderr)
 
 
     def load_wildcard_files(self):
+        """Index the wildcard files by name, e.g. `people/names` for people/names.txt."""
         if not self.wildcards_path:
             return
-        self.wildcard_cache.clear()
-        self.available_wildcards.clear()
-        for file_name in os.listdir(self.wildcards_path):
-            if not file_name.endswith(".txt"):
+        self.clear_cache()
+        self.index_wildcard_files()
+
+
+    def index_wildcard_files(self):
+        """Rebuild the name index, recording folder modification times for reload_changed().
+
+        The new index replaces the old one only when complete, as the Tk thread reads it while the
+        watcher rebuilds it.
+        """
+        wildcard_files = {}
+        available_wildcards = set()
+        directory_stats = {}
+        pending = [(self.wildcards_path, "")]
+        visited = set()
+        while pending:
+            directory, prefix = pending.pop()
+            # Symlinked folders may loop back on themselves
+            real_path = os.path.realpath(directory)
+            if real_path in visited:
                 continue
-            base_name = os.path.splitext(file_name)[0]
-            self.available_wildcards.add(base_name)
-            self.load_wildcard(base_name)
+            visited.add(real_path)
+            try:
+                directory_stats[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending.append((entry.path, f"{prefix}{entry.name}/"))
+                        elif entry.name.endswith(".txt") and entry.is_file():
+                            wildcard_name = prefix + entry.name[:-4]
+                            wildcard_files[wildcard_name] = entry.path
+                            available_wildcards.add(wildcard_name)
+            except OSError as e:
+                print(f"ERROR - load_wildcard_files(): {e}", file=sys.stderr)
+        self.wildcard_files = wildcard_files
+        self.available_wildcards = available_wildcards
+        self.directory_stats = directory_stats
+
+
+    def clear_cache(self):
+        for wildcard_name in list(self.wildcard_cache):
+            self.drop_wildcard(wildcard_name)
+        self.wildcard_cache.clear()
+        self.wildcard_sizes.clear()
+        self.wildcard_stats.clear()
+        self.wildcard_weights.clear()
+        self.cache_bytes = 0
+
+
+    def drop_wildcard(self, wildcard_name):
+        """Remove one wildcard from the cache; it is read again from disk on next use."""
+        options = self.wildcard_cache.pop(wildcard_name, None)
+        if isinstance(options, MappedWildcard):
+            # An open mapping stops editors from saving the file on Windows
+            options.close()
+        self.wildcard_weights.pop(wildcard_name, None)
+        self.wildcard_stats.pop(wildcard_name, None)
+        self.wildcard_generations.pop(wildcard_name, None)
+        self.cache_bytes -= self.wildcard_sizes.pop(wildcard_name, 0)
+        for callback in list(self.drop_callbacks):
+            function = callback()
+            if function is None:
+                self.drop_callbacks.remove(callback)
+            else:
+                function(wildcard_name)
+
+
+    def add_drop_callback(self, callback):
+        """Register a weakref.WeakMethod called with the name of each wildcard dropped from the cache."""
+        self.drop_callbacks.append(callback)
+
+
+    def reload_changed(self):
+        """Drop wildcards whose file changed and re-index if files came or went.
+
+        Returns (names of the wildcards that changed, whether the index was rebuilt).
+        """
+        changed = set()
+        if not self.wildcards_path:
+            return changed, False
+        reindex = False
+        for directory, mtime in self.directory_stats.items():
+            try:
+                reindex = os.stat(directory).st_mtime_ns != mtime
+            except OSError:
+                reindex = True
+            if reindex:
+                break
+        if reindex:
+            previous = self.available_wildcards
+            self.index_wildcard_files()
+            changed |= previous ^ self.available_wildcards
+        for wildcard_name in list(self.wildcard_cache):
+            wildcard_file = self.wildcard_files.get(wildcard_name) or self.get_wildcard_file(wildcard_name)
+            try:
+                stat = os.stat(wildcard_file)
+                current = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                current = None
+            if current != self.wildcard_stats.get(wildcard_name):
+                self.drop_wildcard(wildcard_name)
+                changed.add(wildcard_name)
+        return changed, reindex
 
 
     def load_wildcard(self, wildcard_name):
         if not self.wildcards_path:
             return None
         # Return cached content if available
-        if wildcard_name in self.wildcard_cache:
-            return self.wildcard_cache[wildcard_name]
-        # Load from file
-        wildcard_file = os.path.join(self.wildcards_path, f"{wildcard_name}.txt")
-        if not os.path.exists(wildcard_file):
-            return None
+        options = self.wildcard_cache.get(wildcard_name)
+        if options is not None:
+            if self.max_cache_bytes is not None:
+                self.wildcard_cache.move_to_end(wildcard_name)
+            return options
+        # Load from file; files added since the folder was indexed are still found
+        wildcard_file = self.wildcard_files.get(wildcard_name)
+        if wildcard_file is None:
+            wildcard_file = self.get_wildcard_file(wildcard_name)
+            if wildcard_file is None or not os.path.exists(wildcard_file):
+                return None
         try:
+            file_size = os.path.getsize(wildcard_file)
+            if self.mmap_threshold is not None and file_size >= self.mmap_threshold:
+                return self.load_mapped_wildcard(wildcard_name, wildcard_file)
+            if self.compiled_cache is not None:
+                options = self.load_compiled_wildcard(wildcard_name, wildcard_file)
+                if options is not None:
+                    return options
             with open(wildcard_file, 'r', encoding='utf-8') as f:
-                options = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+                stat = os.fstat(f.fileno())
+                if self.compact_threshold is not None and file_size >= self.compact_threshold:
+                    options, weights = self.read_compact(f)
+                else:
+                    options = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+                    weights = None
+                    if options:
+                        options, weights = self.split_weights(options)
                 if options:
-                    self.wildcard_cache[wildcard_name] = options
+                    self.cache_wildcard(wildcard_name, options, weights)
+                    self.wildcard_stats[wildcard_name] = (stat.st_size, stat.st_mtime_ns)
+                    if self.compiled_cache is not None:
+                        self.store_compiled_wildcard(wildcard_file, stat, options, weights)
                     return options
         except Exception as e:
-            print(f"ERROR - load_wildcard(): {e}")
+            print(f"ERROR - load_wildcard(): {e}", file=sys.stderr)
         return None
 
 
+    def read_compact(self, file):
+        """Stream an open file into an OptionStore. Returns (options, weights as an array('d') or None)."""
+        weights = None
+        count = 0
+
+        def iter_options():
+            nonlocal weights, count
+            for line in file:
+                if line.startswith('#'):
+                    continue
+                line = line.strip()
+                if not line:
+                    continue
+                weight = 1.0
+                if '::' in line:
+                    match = WEIGHT_PATTERN.match(line)
+                    if match:
+                        weight = float(match.group(1))
+                        line = line[match.end():].strip()
+                        if weights is None:
+                            weights = array('d', [1.0]) * count
+                if weights is not None:
+                    weights.append(weight)
+                count += 1
+                yield line
+        options = OptionStore.from_lines(iter_options())
+        return options, weights
+
+
+    def load_compiled_wildcard(self, wildcard_name, wildcard_file):
+        """Load a wildcard from the compiled cache if the file is unchanged, without parsing it."""
+        stat = os.stat(wildcard_file)
+        compiled = self.compiled_cache.lookup(os.path.abspath(wildcard_file), stat.st_size, stat.st_mtime_ns)
+        if compiled is None:
+            return None
+        buffer, offsets, weights = compiled
+        options = OptionStore(buffer, offsets)
+        if self.compact_threshold is None or stat.st_size < self.compact_threshold:
+            options = options.tolist()
+            if weights is not None:
+                weights = weights.tolist()
+        self.cache_wildcard(wildcard_name, options, weights)
+        self.wildcard_stats[wildcard_name] = (stat.st_size, stat.st_mtime_ns)
+        return options
+
+
+    def store_compiled_wildcard(self, wildcard_file, stat, options, weights):
+        if not isinstance(options, OptionStore):
+            options = OptionStore.from_lines(options)
+        self.compiled_cache.store(os.path.abspath(wildcard_file), stat.st_size, stat.st_mtime_ns, options.buffer, options.offsets, weights)
+
+
+    def load_mapped_wildcard(self, wildcard_name, wildcard_file):
+        directory = os.path.dirname(wildcard_file)
+        directory_mtime = self.directory_stats.get(directory)
+        unchanged = directory_mtime is not None and os.stat(directory).st_mtime_ns == directory_mtime
+        options = MappedWildcard.open(wildcard_file)
+        if unchanged:
+            # Writing the .idx file changes the folder's time; that alone should not trigger a re-index
+            self.directory_stats[directory] = os.stat(directory).st_mtime_ns
+        if not len(options):
+            options.close()
+            return None
+        self.cache_wildcard(wildcard_name, options, options.weights)
+        self.wildcard_stats[wildcard_name] = (options.size, options.mtime_ns)
+        return options
+
+
+    def cache_wildcard(self, wildcard_name, options, weights):
+        self.wildcard_cache[wildcard_name] = options
+        # Caches built from the options are keyed by this rather than by the options themselves
+        self.load_generation += 1
+        self.wildcard_generations[wildcard_name] = self.load_generation
+        if weights:
+            self.wildcard_weights[wildcard_name] = weights
+        if self.max_cache_bytes is None:
+            return
+        if isinstance(options, MappedWildcard):
+            size = options.index_bytes
+        elif isinstance(options, OptionStore):
+            size = options.nbytes
+        else:
+            size = sys.getsizeof(options) + sum(map(sys.getsizeof, options))
+        self.wildcard_sizes[wildcard_name] = size
+        self.cache_bytes += size
+        # Evict least recently used wildcards, always keeping the one just loaded
+        while self.cache_bytes > self.max_cache_bytes and len(self.wildcard_cache) > 1:
+            self.drop_wildcard(next(iter(self.wildcard_cache)))
+
+
+    def get_wildcard_file(self, wildcard_name):
+        """Return the file path of a wildcard name, or None if it would point outside the folder."""
+        parts = wildcard_name.split('/')
+        if '..' in parts or '' in parts:
+            return None
+        return os.path.join(self.wildcards_path, *parts[:-1], f"{parts[-1]}.txt")
+
+
+    def split_weights(self, lines):
+        """Strip `weight::` prefixes. Returns (options, weights), with weights None if no line has one."""
+        if not any('::' in line for line in lines):
+            return lines, None
+        options = []
+        weights = []
+        weighted = False
+        for line in lines:
+            match = WEIGHT_PATTERN.match(line)
+            if match:
+                weighted = True
+                weights.append(float(match.group(1)))
+                line = line[match.end():].strip()
+            else:
+                weights.append(1.0)
+            options.append(line)
+        return options, (weights if weighted else None)
+
+
     def get_wildcard_options(self, wildcard_name):
         return self.load_wildcard(wildcard_name)
 
 
+    def get_wildcard_generation(self, wildcard_name):
+        return self.wildcard_generations.get(wildcard_name)
+
+
+    def get_wildcard_weights(self, wildcard_name):
+        if self.load_wildcard(wildcard_name) is None:
+            return None
+        return self.wildcard_weights.get(wildcard_name)
+
+
     def get_available_wildcards(self):
         return sorted(list(self.available_wildcards))
 
 
     def reload_wildcards(self):
-        self.wildcard_cache.clear()
+        self.clear_cache()
         self.load_wildcard_files()
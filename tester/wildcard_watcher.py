@@ -0,0 +1,72 @@
+"""Background polling of the wildcards folder for edited, added and removed files."""
+
+import queue
+import sys
+import threading
+
+
+WATCH_INTERVAL = 0.5
+
+
+class WildcardWatcher:
+    """Calls WildcardManager.reload_changed() every `interval` seconds on a daemon thread.
+
+    Checks and `on_change` run under the render worker's lock. Changes are collected on the
+    Tk thread with get_changes().
+    """
+    def __init__(self, wildcard_manager, lock, on_change=None, interval=WATCH_INTERVAL):
+        self.wildcard_manager = wildcard_manager
+        self.lock = lock
+        self.on_change = on_change
+        self.interval = interval
+        self.changes = queue.SimpleQueue()
+        self.stop_event = None
+        self.thread = None
+
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+
+    def start(self):
+        if self.thread is not None:
+            return
+        # A fresh event per thread, so a watcher stopped and restarted quickly never runs twice
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(self.stop_event,), name="WildcardWatcher", daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread = None
+
+
+    def run(self, stop_event):
+        while not stop_event.wait(self.interval):
+            try:
+                with self.lock:
+                    changed, reindexed = self.wildcard_manager.reload_changed()
+                    if changed and self.on_change is not None:
+                        self.on_change()
+            except Exception as e:
+                print(f"ERROR - WildcardWatcher: {e}", file=sys.stderr)
+                continue
+            if changed or reindexed:
+                self.changes.put((changed, reindexed))
+
+
+    def get_changes(self):
+        """Return (changed names, reindexed) merged from every check since the last call."""
+        changed = set()
+        reindexed = False
+        while True:
+            try:
+                names, index_changed = self.changes.get_nowait()
+            except queue.Empty:
+                return changed, reindexed
+            changed |= names
+            reindexed = reindexed or index_changed
@@ -0,0 +1,138 @@
+import os
+from array import array
+
+import pytest
+
+from tester.compiled_cache import CACHE_HEADER, ENTRY_HEADER, CompiledCache
+
+
+BUFFER = b"red\ngreen\nblue\n"
+OFFSETS = array('I', [0, 4, 10, 15])
+WEIGHTS = array('d', [1.0, 2.5, 0.5])
+
+
+@pytest.fixture
+def wildcard_file(tmp_path):
+    path = tmp_path / "colors.txt"
+    path.write_bytes(b"red\n2.5::green\n.5::blue\n")
+    return str(path)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "compiled.bin")
+
+
+def version(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def store(cache_path, path, offsets=OFFSETS, weights=WEIGHTS):
+    CompiledCache(cache_path).store(path, *version(path), BUFFER, offsets, weights)
+
+
+def lookup(cache_path, path):
+    return CompiledCache(cache_path).lookup(path, *version(path))
+
+
+def assert_payload(payload, offsets=OFFSETS, weights=WEIGHTS):
+    assert payload is not None
+    buffer, stored_offsets, stored_weights = payload
+    assert buffer == BUFFER
+    assert list(stored_offsets) == list(offsets)
+    if weights is None:
+        assert stored_weights is None
+    else:
+        assert list(stored_weights) == list(weights)
+
+
+def test_round_trip(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    assert_payload(lookup(cache_path, wildcard_file))
+
+
+def test_round_trip_wide_offsets_without_weights(wildcard_file, cache_path):
+    offsets = array('Q', OFFSETS)
+    store(cache_path, wildcard_file, offsets, None)
+    assert_payload(lookup(cache_path, wildcard_file), offsets, None)
+
+
+def test_store_skips_current_entry(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    size = os.path.getsize(cache_path)
+    store(cache_path, wildcard_file)
+    assert os.path.getsize(cache_path) == size
+
+
+def test_changed_size_is_stale(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    with open(wildcard_file, 'ab') as file:
+        file.write(b"black\n")
+    assert lookup(cache_path, wildcard_file) is None
+
+
+def test_changed_content_with_same_size_is_stale(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    size, mtime_ns = version(wildcard_file)
+    with open(wildcard_file, 'r+b') as file:
+        file.write(b"bed")
+    os.utime(wildcard_file, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    assert version(wildcard_file)[0] == size
+    assert lookup(cache_path, wildcard_file) is None
+
+
+def test_touched_file_hits_and_records_new_time(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    _, mtime_ns = version(wildcard_file)
+    os.utime(wildcard_file, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    assert_payload(lookup(cache_path, wildcard_file))
+    cache = CompiledCache(cache_path)
+    cache.load()
+    assert cache.entries[wildcard_file][1] == mtime_ns + 10**9
+
+
+def test_deleted_file_is_dropped(wildcard_file, cache_path, tmp_path):
+    other = tmp_path / "other.txt"
+    other.write_bytes(b"x\n")
+    store(cache_path, wildcard_file)
+    store(cache_path, str(other))
+    os.remove(wildcard_file)
+    cache = CompiledCache(cache_path)
+    cache.load()
+    assert list(cache.entries) == [str(other)]
+
+
+@pytest.mark.parametrize("cut", [1, len(BUFFER), ENTRY_HEADER.size + 40])
+def test_truncated_entry_is_dropped(wildcard_file, cache_path, tmp_path, cut):
+    other = tmp_path / "other.txt"
+    other.write_bytes(b"x\n")
+    store(cache_path, wildcard_file)
+    store(cache_path, str(other))
+    with open(cache_path, 'r+b') as file:
+        file.truncate(os.path.getsize(cache_path) - cut)
+    assert_payload(lookup(cache_path, wildcard_file))
+    assert lookup(cache_path, str(other)) is None
+    cache = CompiledCache(cache_path)
+    cache.load()
+    assert list(cache.entries) == [wildcard_file]
+    assert cache.entries[wildcard_file][3] + 1 < os.path.getsize(cache_path)
+
+
+def test_truncated_header_is_replaced(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    with open(cache_path, 'r+b') as file:
+        file.truncate(CACHE_HEADER.size - 1)
+    assert lookup(cache_path, wildcard_file) is None
+    assert os.path.getsize(cache_path) == CACHE_HEADER.size
+    store(cache_path, wildcard_file)
+    assert_payload(lookup(cache_path, wildcard_file))
+
+
+def test_bad_header_is_replaced(wildcard_file, cache_path):
+    store(cache_path, wildcard_file)
+    with open(cache_path, 'r+b') as file:
+        file.write(b'XXXX')
+    assert lookup(cache_path, wildcard_file) is None
+    with open(cache_path, 'rb') as file:
+        assert file.read() == CACHE_HEADER.pack(b'WCCC', 1)
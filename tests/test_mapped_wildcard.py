@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from tester.mapped_wildcard import INDEX_HEADER, MappedWildcard, index_path
+
+
+LINES = [
+    "# comment {not} __dynamic__",
+    "plain",
+    "",
+    "  2::weighted  ",
+    "{a|b} variant",
+    "   ",
+    ".5::__other__",
+    "last",
+]
+
+
+@pytest.fixture
+def wildcard_file(tmp_path):
+    path = tmp_path / "names.txt"
+    path.write_text('\n'.join(LINES) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def open_mapped(path):
+    mapped = MappedWildcard.open(path)
+    options = list(mapped)
+    weights = None if mapped.weights is None else list(mapped.weights)
+    mapped.close()
+    return options, weights
+
+
+def test_round_trip(wildcard_file):
+    options, weights = open_mapped(wildcard_file)
+    assert options == ["plain", "weighted", "{a|b} variant", "__other__", "last"]
+    assert weights == [1.0, 2.0, 1.0, 0.5, 1.0]
+    assert os.path.exists(index_path(wildcard_file))
+
+
+def test_saved_index_is_reused(wildcard_file, monkeypatch):
+    expected = open_mapped(wildcard_file)
+
+    def fail(*args):
+        raise AssertionError("index rebuilt")
+    monkeypatch.setattr(MappedWildcard, 'build_index', staticmethod(fail))
+    assert open_mapped(wildcard_file) == expected
+
+
+def test_stale_index_is_rebuilt(wildcard_file):
+    open_mapped(wildcard_file)
+    with open(wildcard_file, 'a', encoding='utf-8') as file:
+        file.write("added\n")
+    options, _ = open_mapped(wildcard_file)
+    assert options[-1] == "added"
+
+
+@pytest.mark.parametrize("size", [0, INDEX_HEADER.size - 1, INDEX_HEADER.size + 3])
+def test_truncated_index_is_rebuilt(wildcard_file, size):
+    expected = open_mapped(wildcard_file)
+    with open(index_path(wildcard_file), 'r+b') as file:
+        file.truncate(size)
+    assert open_mapped(wildcard_file) == expected
+
+
+def test_bad_magic_is_rebuilt(wildcard_file):
+    expected = open_mapped(wildcard_file)
+    with open(index_path(wildcard_file), 'r+b') as file:
+        file.write(b'XXXX')
+    assert open_mapped(wildcard_file) == expected
+
+
+def test_closed_wildcard_maps_again(wildcard_file):
+    mapped = MappedWildcard.open(wildcard_file)
+    mapped.close()
+    assert mapped[-1] == "last"
+    mapped.close()
+
+
+def test_dynamic_line_indices(wildcard_file):
+    mapped = MappedWildcard.open(wildcard_file)
+    assert list(mapped.dynamic_line_indices()) == [2, 3]
+    mapped.close()
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b'')
+    mapped = MappedWildcard.open(str(path))
+    assert len(mapped) == 0
+    mapped.close()